@@ -1,75 +1,230 @@
 import os
 import json
 import time
+import threading
 import anthropic
 from datetime import datetime
 
 from config import BRANCHES, BRANCH_HOURS
 from tools.notion_tools import (
     create_task,
+    create_tasks,
     get_tasks,
     update_task_status,
     save_meeting_notes,
     get_weekly_hours_by_branch,
     log_time,
 )
-from tools.calendar_tools import get_calendar_events, block_calendar_time, delete_calendar_event
+from tools.calendar_tools import (
+    get_calendar_events,
+    get_calendar_events_range,
+    find_free_slots,
+    block_calendar_time,
+    block_calendar_times,
+    delete_calendar_event,
+)
 from tools.gmail_tools import read_emails, get_email_body
 from tools.memory_tools import get_memory, update_memory
+from tools.memory_sections import select_sections
 from tools.contacts_tools import add_contact, get_contacts, update_contact
 from tools.documents_tools import save_document, search_documents, get_document_content
+from tools.rag import context_keywords
 from tools.sheets_tools import get_editorial_articles, mark_article, get_editorial_style, get_editorial_references, create_article
 from tools.editor_agent import review_article
 from tools.search_tools import web_search
-from tools.conversation_memory import get_recent_summaries, search_summaries, get_summary_content
+from tools.analytics import get_productivity_stats
+from tools.conversation_memory import (
+    LEVEL_SESSION,
+    LEVELS,
+    get_layered_summaries,
+    search_summaries,
+    select_relevant_summaries,
+    search_summaries_text,
+    get_summary_content,
+)
 
 client = anthropic.Anthropic()
 
+# ─────────────────────────────────────────────
+# Stale-while-revalidate cache (never block a message on Notion)
+# ─────────────────────────────────────────────
+
+class _StaleWhileRevalidate:
+    """Serve the last known value immediately; refresh it in the background once stale.
+
+    Only one load runs at a time. The value is persisted to `path` so a
+    restarted process starts warm. Only a cold start (nothing in memory or on
+    disk) waits for the loader. A load that started before the last set() is
+    discarded, since it may predate that write.
+    """
+
+    def __init__(self, name: str, loader, ttl: float, path: str, default):
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.path = path
+        self.default = default
+        self._value = None
+        self._ts = 0.0
+        self._has_value = False
+        self._disk_checked = False
+        self._refreshing = False
+        self._generation = 0                   # bumped by set()
+        self._lock = threading.Lock()          # guards the fields above and the disk copy
+        self._load_lock = threading.Lock()     # single-flight for loader calls
+
+    def get(self):
+        with self._lock:
+            if not self._disk_checked:
+                self._read_disk()
+            if self._has_value:
+                value = self._value
+                if time.time() - self._ts > self.ttl and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh_in_background, daemon=True).start()
+                return value
+        try:
+            return self.refresh(only_if_missing=True)
+        except Exception as e:
+            print(f"⚠️ {self.name}: carga inicial fallida: {e}")
+            return self.default(e) if callable(self.default) else self.default
+
+    def refresh(self, only_if_missing: bool = False):
+        """Load now (blocking) and store the result."""
+        with self._load_lock:
+            if only_if_missing and self._has_value:
+                return self._value
+            with self._lock:
+                generation = self._generation
+            value = self.loader()
+            with self._lock:
+                if self._generation != generation:
+                    # set() ran meanwhile: its value is newer than this load may be
+                    return self._value
+                self._value, self._ts, self._has_value = value, time.time(), True
+                self._write_disk(value)
+            return value
+
+    def set(self, value):
+        """Store a value known to be current (e.g. right after writing it)."""
+        with self._lock:
+            self._generation += 1
+            self._value, self._ts, self._has_value = value, time.time(), True
+            self._write_disk(value)
+
+    def invalidate(self):
+        """Mark stale: the next get() still answers at once but triggers a refresh."""
+        with self._lock:
+            self._ts = 0.0
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"⚠️ {self.name}: refresco en segundo plano fallido, sigo con el valor anterior: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _read_disk(self):
+        self._disk_checked = True
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._value, self._ts, self._has_value = data["value"], data["ts"], True
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+
+    def _write_disk(self, value):
+        try:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"value": value, "ts": time.time()}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"⚠️ {self.name}: no se pudo guardar en disco: {e}")
+
+
 # ─────────────────────────────────────────────
 # Memory cache (avoid hitting Notion on every message)
 # ─────────────────────────────────────────────
 
-_memory_cache: str = ""
-_memory_cache_ts: float = 0.0
 _MEMORY_TTL = 300  # refresh every 5 minutes
 
 
+def _load_memory() -> str:
+    memory = get_memory()
+    if memory.startswith("[Error"):
+        # get_memory reports failures in-band; don't cache them
+        raise RuntimeError(memory)
+    return memory
+
+
+_memory_cache = _StaleWhileRevalidate(
+    "Memoria",
+    _load_memory,
+    ttl=_MEMORY_TTL,
+    path=os.environ.get("MEMORY_CACHE_FILE", "memory_cache.json"),
+    default=str,
+)
+
+
 def get_memory_cached() -> str:
-    global _memory_cache, _memory_cache_ts
-    if time.time() - _memory_cache_ts > _MEMORY_TTL:
-        _memory_cache = get_memory()
-        _memory_cache_ts = time.time()
-    return _memory_cache
+    return _memory_cache.get()
+
+
+def refresh_memory_cache() -> str | None:
+    """Read memory from Notion now (blocking) and update the cache.
+
+    For callers that build on the memory (consolidation), where a stale copy
+    would overwrite recent changes. Returns None if the read failed.
+    """
+    try:
+        return _memory_cache.refresh()
+    except Exception as e:
+        print(f"⚠️ Memoria: lectura fallida: {e}")
+        return None
+
+
+def set_memory_cache(memory: str):
+    """Cache memory that was just written, so the next turn already sees it."""
+    _memory_cache.set(memory)
 
 
 def invalidate_memory_cache():
-    global _memory_cache_ts
-    _memory_cache_ts = 0.0
+    _memory_cache.invalidate()
 
 
 # ─────────────────────────────────────────────
 # Conversation summaries cache
 # ─────────────────────────────────────────────
 
-_summaries_cache: list = []
-_summaries_cache_ts: float = 0.0
 _SUMMARIES_TTL = 300  # refresh every 5 minutes
+_SUMMARIES_LIMIT = 5
+# Candidate pool for relevance ranking; only the best ones reach the prompt
+_CANDIDATE_SESSIONS = 30
+_CANDIDATE_WEEKS = 8
+_CANDIDATE_MONTHS = 6
+
+_summaries_cache = _StaleWhileRevalidate(
+    "Resúmenes",
+    lambda: get_layered_summaries(
+        sessions=_CANDIDATE_SESSIONS, weeks=_CANDIDATE_WEEKS, months=_CANDIDATE_MONTHS
+    ),
+    ttl=_SUMMARIES_TTL,
+    path=os.environ.get("SUMMARIES_CACHE_FILE", "summaries_cache.json"),
+    default=[],
+)
 
 
-def get_summaries_cached(limit: int = 5) -> list:
-    global _summaries_cache, _summaries_cache_ts
-    if time.time() - _summaries_cache_ts > _SUMMARIES_TTL:
-        try:
-            _summaries_cache = get_recent_summaries(limit=limit)
-        except Exception:
-            _summaries_cache = []
-        _summaries_cache_ts = time.time()
-    return _summaries_cache
+def get_summaries_cached(limit: int = None) -> list:
+    """Layered episodic memory: recent sessions, then weekly and monthly digests."""
+    summaries = _summaries_cache.get()
+    return summaries[:limit] if limit else summaries
 
 
 def invalidate_summaries_cache():
-    global _summaries_cache_ts
-    _summaries_cache_ts = 0.0
+    _summaries_cache.invalidate()
 
 
 # ─────────────────────────────────────────────
@@ -116,9 +271,42 @@ TOOLS = [
             "required": ["title", "branch", "priority", "estimated_hours"],
         },
     },
+    {
+        "name": "create_tasks",
+        "description": (
+            "Crea VARIAS tareas en Notion en una sola llamada. Úsalo siempre que haya "
+            "más de una tarea que crear (p. ej. las acciones de una reunión) en lugar "
+            "de llamar a create_task repetidamente. Devuelve el resultado de cada tarea."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "tasks": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "title": {"type": "string", "description": "Título de la tarea"},
+                            "branch": {"type": "string", "enum": BRANCH_ENUM},
+                            "priority": {"type": "string", "enum": ["High", "Medium", "Low"]},
+                            "estimated_hours": {"type": "number"},
+                            "due_date": {"type": "string", "description": "YYYY-MM-DD (opcional)"},
+                            "notes": {"type": "string"},
+                        },
+                        "required": ["title", "branch", "priority", "estimated_hours"],
+                    },
+                    "description": "Tareas a crear",
+                },
+            },
+            "required": ["tasks"],
+        },
+    },
     {
         "name": "get_tasks",
-        "description": "Obtiene las tareas de Notion, opcionalmente filtradas por rama y/o estado.",
+        "description": (
+            "Obtiene las tareas de Notion, opcionalmente filtradas por rama, estado y/o "
+            "rango de fecha límite (p. ej. vencidas: due_before = ayer y estado Pending)."
+        ),
         "input_schema": {
             "type": "object",
             "properties": {
@@ -132,6 +320,14 @@ TOOLS = [
                     "enum": ["Pending", "In Progress", "Done"],
                     "description": "Filtrar por estado (opcional)",
                 },
+                "due_after": {
+                    "type": "string",
+                    "description": "Solo tareas con fecha límite en o después de esta fecha (YYYY-MM-DD, opcional)",
+                },
+                "due_before": {
+                    "type": "string",
+                    "description": "Solo tareas con fecha límite en o antes de esta fecha (YYYY-MM-DD, opcional)",
+                },
             },
             "required": [],
         },
@@ -162,7 +358,8 @@ TOOLS = [
         "name": "save_meeting_notes",
         "description": (
             "Guarda las notas de una reunión en Notion. Después de guardarlas, "
-            "extrae automáticamente las acciones y crea las tareas correspondientes."
+            "extrae automáticamente las acciones y crea todas las tareas "
+            "correspondientes con una sola llamada a create_tasks."
         ),
         "input_schema": {
             "type": "object",
@@ -195,6 +392,22 @@ TOOLS = [
             "required": [],
         },
     },
+    {
+        "name": "get_calendar_events_range",
+        "description": (
+            "Obtiene los eventos de Google Calendar entre dos fechas (ambas incluidas) "
+            "en una sola llamada, agrupados por día. Úsalo para planificar la semana "
+            "en lugar de llamar a get_calendar_events día a día."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "start": {"type": "string", "description": "Fecha inicial YYYY-MM-DD"},
+                "end": {"type": "string", "description": "Fecha final YYYY-MM-DD (incluida)"},
+            },
+            "required": ["start", "end"],
+        },
+    },
     {
         "name": "block_calendar_time",
         "description": "Crea un bloque de trabajo enfocado en Google Calendar.",
@@ -216,13 +429,80 @@ TOOLS = [
                     "description": "Rama de trabajo para este bloque",
                 },
                 "notes": {"type": "string", "description": "Notas adicionales (opcional)"},
+                "allow_overlap": {
+                    "type": "boolean",
+                    "description": (
+                        "Crear el bloque aunque se solape con otro evento "
+                        "(por defecto false: devuelve los conflictos sin crear nada)"
+                    ),
+                },
             },
             "required": ["title", "start_time", "end_time", "branch"],
         },
     },
+    {
+        "name": "block_calendar_times",
+        "description": (
+            "Crea VARIOS bloques de trabajo en Google Calendar en una sola petición. "
+            "Úsalo al confirmar una agenda en lugar de llamar a block_calendar_time "
+            "por cada bloque. Devuelve el resultado de cada bloque."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "blocks": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "title": {"type": "string", "description": "Descripción del bloque"},
+                            "start_time": {"type": "string", "description": "Inicio en ISO 8601"},
+                            "end_time": {"type": "string", "description": "Fin en ISO 8601"},
+                            "branch": {"type": "string", "enum": BRANCH_ENUM},
+                            "notes": {"type": "string"},
+                        },
+                        "required": ["title", "start_time", "end_time", "branch"],
+                    },
+                    "description": "Bloques a crear",
+                },
+                "allow_overlap": {
+                    "type": "boolean",
+                    "description": "Crear aunque se solapen con eventos existentes (por defecto false)",
+                },
+            },
+            "required": ["blocks"],
+        },
+    },
+    {
+        "name": "find_free_slots",
+        "description": (
+            "Calcula los huecos libres dentro del horario laboral para un día o un rango "
+            "de días, a partir de los eventos del calendario. Úsalo para planificar "
+            "bloques sin solapes."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "start": {"type": "string", "description": "Fecha inicial YYYY-MM-DD (por defecto hoy)"},
+                "end": {"type": "string", "description": "Fecha final YYYY-MM-DD (por defecto = start)"},
+                "min_minutes": {
+                    "type": "integer",
+                    "description": "Duración mínima de un hueco en minutos (por defecto 30)",
+                },
+                "include_weekends": {
+                    "type": "boolean",
+                    "description": "Incluir sábados y domingos (por defecto false)",
+                },
+            },
+            "required": [],
+        },
+    },
     {
         "name": "read_emails",
-        "description": "Lee correos de Gmail. Por defecto devuelve los no leídos.",
+        "description": (
+            "Lee correos de Gmail. Por defecto devuelve los no leídos. Cada correo incluye "
+            "'triage': needs-reply (persona que espera respuesta), notification o bulk."
+        ),
         "input_schema": {
             "type": "object",
             "properties": {
@@ -238,6 +518,13 @@ TOOLS = [
                     "type": "boolean",
                     "description": "Solo correos recibidos ayer (por defecto false)",
                 },
+                "only_needs_reply": {
+                    "type": "boolean",
+                    "description": (
+                        "Solo correos de personas que esperan respuesta: descarta "
+                        "newsletters, noreply, notificaciones y facturas (por defecto false)"
+                    ),
+                },
             },
             "required": [],
         },
@@ -591,11 +878,32 @@ TOOLS = [
             "required": ["query"],
         },
     },
+    {
+        "name": "get_productivity_stats",
+        "description": (
+            "Estadísticas de productividad de las últimas semanas completas, ya agregadas: "
+            "horas por semana y rama frente al objetivo, tendencia, déficit acumulado, "
+            "tasa de tareas completadas, tareas vencidas y precisión de las estimaciones "
+            "(horas registradas vs estimadas). Úsalo para resúmenes semanales y preguntas "
+            "sobre evolución o ritmo de trabajo."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "weeks": {
+                    "type": "integer",
+                    "description": "Número de semanas completas a analizar (por defecto 8, máx. 52)",
+                }
+            },
+            "required": [],
+        },
+    },
     {
         "name": "generate_agenda_data",
         "description": (
             "Recopila todos los datos para generar la agenda del día: tareas pendientes, "
-            "eventos del calendario, horas trabajadas esta semana y déficit por rama. "
+            "eventos del calendario, huecos libres en horario laboral, horas trabajadas "
+            "esta semana y déficit por rama. "
             "Úsalo SIEMPRE antes de proponer una agenda diaria."
         ),
         "input_schema": {
@@ -632,10 +940,42 @@ TOOLS = [
                     "type": "integer",
                     "description": "Buscar en los últimos N días (por defecto 30)",
                 },
+                "nivel": {
+                    "type": "string",
+                    "enum": LEVELS,
+                    "description": (
+                        "Nivel de resumen: sesión, semanal o mensual (opcional). Para "
+                        "periodos largos, los semanales/mensuales son más compactos."
+                    ),
+                },
             },
             "required": [],
         },
     },
+    {
+        "name": "search_conversation_text",
+        "description": (
+            "Búsqueda de texto libre en el contenido completo de los resúmenes de "
+            "conversaciones (título, narrativa, temas, personas y acciones), ordenada por "
+            "relevancia y con un fragmento de cada resultado. Úsalo cuando busques algo que "
+            "se dijo en una sesión y no sepas el tema exacto; para filtrar por tema, persona "
+            "o fechas usa search_conversation_summaries."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Palabras a buscar",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Máximo de resultados (por defecto 8)",
+                },
+            },
+            "required": ["query"],
+        },
+    },
     {
         "name": "get_conversation_summary",
         "description": "Obtiene el resumen completo de una sesión de conversación por su ID.",
@@ -644,7 +984,7 @@ TOOLS = [
             "properties": {
                 "summary_id": {
                     "type": "string",
-                    "description": "ID del resumen obtenido con search_conversation_summaries",
+                    "description": "ID del resumen obtenido con search_conversation_summaries o search_conversation_text",
                 }
             },
             "required": ["summary_id"],
@@ -671,10 +1011,16 @@ def execute_tool(name: str, tool_input: dict) -> str:
                 notes=tool_input.get("notes", ""),
             )
 
+        elif name == "create_tasks":
+            results = create_tasks(tool_input["tasks"])
+            return json.dumps(results, ensure_ascii=False, indent=2)
+
         elif name == "get_tasks":
             tasks = get_tasks(
                 branch=tool_input.get("branch") or None,
                 status=tool_input.get("status") or None,
+                due_after=tool_input.get("due_after") or None,
+                due_before=tool_input.get("due_before") or None,
             )
             return (
                 json.dumps(tasks, ensure_ascii=False, indent=2)
@@ -704,6 +1050,10 @@ def execute_tool(name: str, tool_input: dict) -> str:
                 else "No hay eventos en el calendario para esa fecha."
             )
 
+        elif name == "get_calendar_events_range":
+            days = get_calendar_events_range(tool_input["start"], tool_input["end"])
+            return json.dumps(days, ensure_ascii=False, indent=2)
+
         elif name == "block_calendar_time":
             return block_calendar_time(
                 title=tool_input["title"],
@@ -711,13 +1061,31 @@ def execute_tool(name: str, tool_input: dict) -> str:
                 end_time=tool_input["end_time"],
                 branch=tool_input["branch"],
                 notes=tool_input.get("notes", ""),
+                allow_overlap=tool_input.get("allow_overlap", False),
+            )
+
+        elif name == "block_calendar_times":
+            results = block_calendar_times(
+                blocks=tool_input["blocks"],
+                allow_overlap=tool_input.get("allow_overlap", False),
+            )
+            return json.dumps(results, ensure_ascii=False, indent=2)
+
+        elif name == "find_free_slots":
+            slots = find_free_slots(
+                start=tool_input.get("start") or None,
+                end=tool_input.get("end") or None,
+                min_minutes=tool_input.get("min_minutes", 30),
+                include_weekends=tool_input.get("include_weekends", False),
             )
+            return json.dumps(slots, ensure_ascii=False, indent=2)
 
         elif name == "read_emails":
             emails = read_emails(
                 max_emails=tool_input.get("max_emails", 10),
                 unread_only=tool_input.get("unread_only", True),
                 yesterday_only=tool_input.get("yesterday_only", False),
+                only_needs_reply=tool_input.get("only_needs_reply", False),
             )
             return (
                 json.dumps(emails, ensure_ascii=False, indent=2)
@@ -820,7 +1188,10 @@ def execute_tool(name: str, tool_input: dict) -> str:
 
         elif name == "update_memory":
             result = update_memory(tool_input["content"])
-            invalidate_memory_cache()
+            if result.startswith("✅"):
+                set_memory_cache(tool_input["content"])
+            else:
+                invalidate_memory_cache()
             return result
 
         elif name == "log_time":
@@ -830,10 +1201,15 @@ def execute_tool(name: str, tool_input: dict) -> str:
                 task_description=tool_input.get("task_description", ""),
             )
 
+        elif name == "get_productivity_stats":
+            stats = get_productivity_stats(tool_input.get("weeks") or 8)
+            return json.dumps(stats, ensure_ascii=False, indent=2)
+
         elif name == "generate_agenda_data":
             date = tool_input.get("date") or datetime.now().strftime("%Y-%m-%d")
             tasks = get_tasks(status="Pending")
             calendar_events = get_calendar_events(date)
+            free_slots = find_free_slots(date, include_weekends=True).get(date, [])
             weekly_hours = get_weekly_hours_by_branch()
 
             deficits = {
@@ -847,6 +1223,7 @@ def execute_tool(name: str, tool_input: dict) -> str:
                     "weekday": datetime.strptime(date, "%Y-%m-%d").strftime("%A"),
                     "pending_tasks": tasks,
                     "calendar_events": calendar_events,
+                    "free_slots": free_slots,
                     "weekly_hours_logged": weekly_hours,
                     "branch_deficits": deficits,
                     "branch_targets": BRANCH_HOURS,
@@ -860,9 +1237,14 @@ def execute_tool(name: str, tool_input: dict) -> str:
                 tema=tool_input.get("tema"),
                 persona=tool_input.get("persona"),
                 dias=tool_input.get("dias", 30),
+                nivel=tool_input.get("nivel"),
             )
             return json.dumps(results, ensure_ascii=False, indent=2) if results else "No se encontraron resúmenes."
 
+        elif name == "search_conversation_text":
+            results = search_summaries_text(tool_input["query"], limit=tool_input.get("limit", 8))
+            return json.dumps(results, ensure_ascii=False, indent=2) if results else "No se encontraron resúmenes."
+
         elif name == "get_conversation_summary":
             return get_summary_content(tool_input["summary_id"])
 
@@ -878,15 +1260,35 @@ def execute_tool(name: str, tool_input: dict) -> str:
 # ─────────────────────────────────────────────
 
 
-def _build_system_prompt(extra_context: str = "") -> str:
+def _build_system_prompt(extra_context: str = "", query: str = None) -> str:
+    """System prompt for one turn.
+
+    With a `query` (the user's message), the prompt gets the profile and
+    active-projects sections, plus any memory section whose keywords appear
+    in the query or in the titles of the retrieved documents. It also gets the
+    conversation summaries that score best against the query. Without a
+    query, it gets the whole memory and the latest session summaries.
+    """
     today = datetime.now().strftime("%A, %d de %B de %Y")
     branches_text = "\n".join(
         f"  {b.emoji} {b.name}: {b.weekly_hours}h/semana" for b in BRANCHES
     )
     memory = get_memory_cached()
+    omitted = []
+    if memory and query is not None:
+        memory, omitted = select_sections(memory, query, keywords=context_keywords(extra_context))
     memory_section = f"\nMEMORIA (contexto de conversaciones anteriores):\n{memory}\n" if memory else ""
+    if omitted:
+        memory_section += (
+            "(Otras secciones de memoria no incluidas aquí: " + ", ".join(omitted)
+            + ". Si las necesitas, llama a get_memory.)\n"
+        )
 
     summaries = get_summaries_cached()
+    if query is not None:
+        summaries = select_relevant_summaries(summaries, query)
+    else:
+        summaries = [s for s in summaries if s.get("level", LEVEL_SESSION) == LEVEL_SESSION][:_SUMMARIES_LIMIT]
     if summaries:
         parts = []
         for s in summaries:
@@ -926,7 +1328,7 @@ Esta regla NO tiene excepciones. Aplica incluso si el usuario dice "borra todo".
 
 COMPORTAMIENTO AUTÓNOMO:
 • Encadena herramientas sin pedir permiso para cada paso intermedio
-• Al recibir notas de reunión → guárdalas Y crea todas las tareas detectadas
+• Al recibir notas de reunión → guárdalas Y crea todas las tareas detectadas con create_tasks
 • Al revisar emails → identifica acciones y propone crear tareas
 • Al generar artículos editoriales (cuando el usuario pida escribir sobre una temática):
   1. Llama a get_editorial_style y get_editorial_references para la plataforma
@@ -939,8 +1341,8 @@ COMPORTAMIENTO AUTÓNOMO:
   Si el editor jefe dice REQUIERE CAMBIOS o RECHAZADO, muestra las correcciones al usuario.
 • Al generar la agenda:
   1. Llama a generate_agenda_data para obtener todos los datos
-  2. Propone bloques concretos priorizando ramas con más déficit
-  3. Si el usuario confirma, bloquéalos TODOS en Google Calendar
+  2. Propone bloques concretos SOLO dentro de free_slots, priorizando ramas con más déficit
+  3. Si el usuario confirma, bloquéalos TODOS en Google Calendar con una sola llamada a block_calendar_times
 • Propón siempre entre 6 y 9 horas de trabajo diario (lunes-viernes)
 
 MEMORIA A LARGO PLAZO — COMPORTAMIENTO SILENCIOSO:
@@ -978,8 +1380,10 @@ Si dudas entre guardar o no guardar, GUARDA — pero siempre silenciosamente,
 después de ejecutar las acciones.
 
 MEMORIA EPISÓDICA (resúmenes de conversaciones):
-Los últimos 5 resúmenes de sesiones pasadas están incluidos arriba automáticamente.
-Si necesitas buscar en sesiones más antiguas, usa search_conversation_summaries.
+Arriba tienes automáticamente los resúmenes (de sesión, semanales o mensuales) más
+relevantes para el mensaje actual, elegidos por temas, personas y cercanía en el tiempo.
+Si necesitas buscar en sesiones más antiguas, usa search_conversation_summaries
+(por tema/persona/fechas/nivel) o search_conversation_text (texto libre en el contenido).
 Cuando el usuario pregunte "¿de qué hablamos de X?" o "¿cuándo hicimos Y?", busca
 primero en los resúmenes incluidos y si no encuentras la respuesta, usa la herramienta de búsqueda.
 
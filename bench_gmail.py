@@ -0,0 +1,137 @@
+"""
+Benchmark de la consulta directa a Gmail de read_emails (_read_emails_live)
+contra un Gmail falso local (sin red ni credenciales).
+
+Compara el patrón antiguo (1 messages.get por correo, en serie) con el
+batch HTTP actual, simulando una latencia fija por petición HTTP.
+Ejecutar: python3 bench_gmail.py
+"""
+import json
+import threading
+import time
+import email
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+import tools.gmail_tools as gmail_tools
+
+LATENCY_SECONDS = 0.05  # latencia simulada por petición HTTP
+SIZES = [1, 5, 10, 30, 50, 100]
+
+
+def _fake_message(msg_id: str) -> dict:
+    return {
+        "id": msg_id,
+        "threadId": msg_id,
+        "snippet": f"Snippet del correo {msg_id}",
+        "payload": {
+            "headers": [
+                {"name": "From", "value": f"Persona {msg_id} <{msg_id}@example.com>"},
+                {"name": "Subject", "value": f"Asunto {msg_id}"},
+                {"name": "Date", "value": "Mon, 1 Jan 2024 09:00:00 +0100"},
+            ]
+        },
+    }
+
+
+class FakeGmailHandler(BaseHTTPRequestHandler):
+    http_requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        FakeGmailHandler.http_requests += 1
+        time.sleep(LATENCY_SECONDS)
+        parsed = urlparse(self.path)
+        if parsed.path.endswith("/messages"):
+            n = int(parse_qs(parsed.query).get("maxResults", ["10"])[0])
+            body = {"messages": [{"id": f"m{i}", "threadId": f"m{i}"} for i in range(n)]}
+        else:
+            body = _fake_message(parsed.path.rsplit("/", 1)[-1])
+        self._send(200, json.dumps(body).encode(), "application/json")
+
+    def do_POST(self):
+        FakeGmailHandler.http_requests += 1
+        time.sleep(LATENCY_SECONDS)
+        raw = self.rfile.read(int(self.headers["Content-Length"]))
+        request = email.message_from_bytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + raw
+        )
+        boundary = "batch_boundary"
+        parts = []
+        for part in request.get_payload():
+            content_id = part["Content-ID"][1:-1]
+            request_line = part.get_payload().split("\n", 1)[0]
+            path = urlparse(request_line.split(" ")[1]).path
+            body = json.dumps(_fake_message(path.rsplit("/", 1)[-1]))
+            parts.append(
+                f"--{boundary}\r\n"
+                f"Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n"
+                f"{body}\r\n"
+            )
+        payload = ("".join(parts) + f"--{boundary}--\r\n").encode()
+        self._send(200, payload, f"multipart/mixed; boundary={boundary}")
+
+
+def _build_fake_service(base_url: str):
+    doc = json.loads(get_static_doc("gmail", "v1"))
+    doc["rootUrl"] = base_url
+    doc["mtlsRootUrl"] = base_url
+    return build_from_document(doc, http=httplib2.Http())
+
+
+def _read_emails_sequential(service, max_emails: int) -> list:
+    """The previous read_emails: one messages.get per message."""
+    result = service.users().messages().list(userId="me", maxResults=max_emails).execute()
+    emails = []
+    for msg in result.get("messages", []):
+        message = gmail_tools._metadata_request(service, msg["id"]).execute()
+        emails.append(gmail_tools._email_summary(message))
+    return emails
+
+
+def _timed(fn) -> tuple[float, int, list]:
+    FakeGmailHandler.http_requests = 0
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, FakeGmailHandler.http_requests, result
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGmailHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    service = _build_fake_service(f"http://127.0.0.1:{server.server_port}/")
+    gmail_tools.get_google_service = lambda *_: service
+
+    print(f"Latencia simulada por petición: {LATENCY_SECONDS * 1000:.0f} ms\n")
+    print(f"{'max_emails':>10} | {'secuencial':>16} | {'batch':>16}")
+    print("-" * 50)
+    for n in SIZES:
+        seq_ms, seq_reqs, seq = _timed(lambda: _read_emails_sequential(service, n))
+        batch_ms, batch_reqs, batched = _timed(
+            lambda: gmail_tools._read_emails_live(max_emails=n, unread_only=False)
+        )
+        assert seq == batched, "batch y secuencial deben devolver lo mismo"
+        print(
+            f"{n:>10} | {seq_ms:>7.0f} ms ({seq_reqs:>3} req) | "
+            f"{batch_ms:>7.0f} ms ({batch_reqs:>3} req)"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,11 @@ response = notion.databases.create(
             }
         },
         "Acciones generadas": {"rich_text": {}},
+        "Nivel": {
+            "select": {
+                "options": [{"name": "sesión"}, {"name": "semanal"}, {"name": "mensual"}]
+            }
+        },
     },
 )
 
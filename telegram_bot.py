@@ -17,8 +17,9 @@ try:
 except Exception:
     MADRID_TZ = datetime.timezone(datetime.timedelta(hours=1))
 
-from agent import TOOLS, execute_tool, _build_system_prompt, get_memory_cached, invalidate_memory_cache, invalidate_summaries_cache
+from agent import TOOLS, execute_tool, _build_system_prompt, refresh_memory_cache, set_memory_cache, invalidate_memory_cache, invalidate_summaries_cache
 from tools.memory_tools import update_memory
+from tools.memory_sections import apply_patch
 from tools.conversation_memory import save_conversation_summary
 from tools.rag import get_relevant_context
 
@@ -63,6 +64,7 @@ _chat_locks: dict[str, asyncio.Lock] = {}
 _last_message_ts: dict[str, float] = {}
 SESSION_GAP_SECONDS = int(os.environ.get("SESSION_GAP_MINUTES", "30")) * 60
 MIN_SESSION_MESSAGES = 4  # minimum user messages to trigger a summary
+SUMMARY_SYNC_SECONDS = 600  # background sync of the local summary store
 
 # ─────────────────────────────────────────────
 # Conversation sanitization
@@ -140,7 +142,7 @@ DAILY_BRIEFING_PROMPT = """Genera el briefing diario completo. Sé directo y est
 
 Pasos que debes seguir EN ESTE ORDEN:
 1. Llama a web_search con la query: "most important artificial intelligence news today, major AI announcements, OpenAI Anthropic Google DeepMind Meta AI Microsoft" — noticias de IA de HOY
-2. Llama a read_emails (yesterday_only=true, unread_only=false, max_emails=30) para revisar emails del día anterior
+2. Llama a read_emails (yesterday_only=true, unread_only=false, max_emails=30, only_needs_reply=true) para revisar emails del día anterior que esperan respuesta (ya vienen filtrados)
 3. Llama a generate_agenda_data para obtener eventos del día, tareas pendientes, horas consumidas por rama y déficit de horas
 
 Con todos los datos, genera el briefing con estas secciones EN ESTE ORDEN:
@@ -159,8 +161,7 @@ Por cada noticia: titular, una frase de contexto y link directo al medio que la
 
 📧 EMAILS A RESPONDER
 REGLA ESTRICTA: solo emails de personas reales que esperan respuesta directa tuya.
-Excluir sin excepciones: newsletters, marketing, notificaciones automáticas, noreply, alertas de plataformas, confirmaciones, facturas.
-Excepción LinkedIn: incluir SOLO notificaciones de mensaje directo recibido ("tienes un nuevo mensaje de X"). Excluir todo lo demás de LinkedIn (visitas al perfil, likes, sugerencias, invitaciones, etc.).
+read_emails ya descarta newsletters, noreply, notificaciones, facturas y LinkedIn (salvo mensajes directos). Si aun así se cuela alguno de ese tipo, exclúyelo.
 Si no hay ninguno: "Nada urgente."
 
 📅 AGENDA PROPUESTA
@@ -174,6 +175,7 @@ WEEKLY_SUMMARY_PROMPT = """Genera el resumen semanal de productividad. Sé direc
 Pasos que debes seguir:
 1. Llama a generate_agenda_data para obtener horas trabajadas esta semana, déficit por rama y tareas
 2. Llama a get_tasks con status=Done para ver qué se ha completado
+3. Llama a get_productivity_stats para obtener tendencias, déficit acumulado y tasas de cumplimiento ya calculados (no los recalcules)
 
 Con los datos, genera el resumen con estas secciones:
 
@@ -183,8 +185,11 @@ Horas reales vs objetivo por rama. Porcentaje de cumplimiento. Total semanal.
 ✅ COMPLETADO ESTA SEMANA
 Tareas cerradas. Si no hay datos claros, menciona los avances más relevantes detectados.
 
+📈 TENDENCIAS
+Ramas que suben o bajan respecto a las semanas anteriores, tasa de tareas completadas y si las estimaciones se quedan cortas.
+
 🔴 DÉFICIT ACUMULADO
-Las ramas con más horas por recuperar y qué significa para la próxima semana.
+Las ramas con más horas por recuperar (últimas semanas) y qué significa para la próxima semana.
 
 📋 PRIORIDADES PRÓXIMA SEMANA
 Top 5 tareas más importantes para la próxima semana basándote en las pendientes.
@@ -211,7 +216,7 @@ async def _run_briefing(context: ContextTypes.DEFAULT_TYPE, prompt: str, header:
     await context.bot.send_chat_action(chat_id=target, action="typing")
 
     rag_context = await asyncio.to_thread(get_relevant_context, prompt)
-    system_prompt = _build_system_prompt(extra_context=rag_context)
+    system_prompt = _build_system_prompt(extra_context=rag_context, query=prompt)
     messages = [{"role": "user", "content": prompt}]
 
     try:
@@ -292,9 +297,9 @@ async def weekly_summary_job(context: ContextTypes.DEFAULT_TYPE):
 async def google_token_keepalive_job(context: ContextTypes.DEFAULT_TYPE):
     """Refresh Google token every 5 days to prevent expiry in Testing mode."""
     try:
-        from tools.google_auth import get_credentials
-        await asyncio.to_thread(get_credentials)
-        print("🔑 Google token keep-alive: OK")
+        from tools.google_auth import credential_manager
+        await asyncio.to_thread(credential_manager.refresh)
+        print(f"🔑 Google token keep-alive: OK {credential_manager.stats()}")
     except Exception as e:
         print(f"⚠️ Google token keep-alive falló: {e}")
         if TELEGRAM_CHAT_ID:
@@ -304,6 +309,31 @@ async def google_token_keepalive_job(context: ContextTypes.DEFAULT_TYPE):
             )
 
 
+async def summary_rollup_job(context: ContextTypes.DEFAULT_TYPE):
+    """Nightly: merge finished weeks/months of session summaries into digests."""
+    try:
+        from tools.summary_rollup import rollup_summaries
+        written = await asyncio.to_thread(rollup_summaries)
+        if written["weekly"] or written["monthly"]:
+            invalidate_summaries_cache()
+        print(f"🗜️ Compactación de resúmenes: {written}")
+    except Exception as e:
+        print(f"⚠️ Compactación de resúmenes falló: {e}")
+
+
+async def summary_sync_job(context: ContextTypes.DEFAULT_TYPE):
+    """Keep the local summary store (prompt layers + full-text search) in sync with Notion.
+
+    The first run after a fresh deploy backfills every summary body, which is
+    why it lives here and not in the request path.
+    """
+    try:
+        from tools.conversation_memory import sync_summary_store
+        await asyncio.to_thread(sync_summary_store)
+    except Exception as e:
+        print(f"⚠️ Sincronización de resúmenes falló: {e}")
+
+
 # ─────────────────────────────────────────────
 # Command handlers
 # ─────────────────────────────────────────────
@@ -330,8 +360,16 @@ async def debug(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
     try:
-        from tools.google_auth import get_google_service
-        get_google_service("calendar", "v3")
+        # Services and tokens are cached, so force a token refresh and make a
+        # real (minimal) API call instead of trusting the cached objects
+        from tools.google_auth import credential_manager, get_google_service
+
+        def _check_calendar():
+            credential_manager.refresh()
+            service = get_google_service("calendar", "v3")
+            return service.calendars().get(calendarId="primary", fields="id").execute()
+
+        await asyncio.to_thread(_check_calendar)
         msg += "Google Calendar: ✅\n"
     except Exception as e:
         msg += f"Google Calendar: ❌ {e}\n"
@@ -405,26 +443,123 @@ def _extract_text_from_message(msg: dict) -> str:
     return ""
 
 
-async def _consolidate_memory(chat_id: str):
-    """Background task: after each exchange, extract learnings and update memory via Sonnet."""
+# ─────────────────────────────────────────────
+# Memory consolidation scheduling
+# ─────────────────────────────────────────────
+
+CONSOLIDATE_EVERY_EXCHANGES = int(os.environ.get("CONSOLIDATE_EVERY_EXCHANGES", "5"))
+CONSOLIDATE_QUIET_SECONDS = int(os.environ.get("CONSOLIDATE_QUIET_SECONDS", "180"))
+CONSOLIDATE_MAX_MESSAGES = 30   # cap on new messages sent per run
+CONSOLIDATE_CONTEXT_MESSAGES = 4  # already-processed messages shown for context
+
+_pending_exchanges: dict[str, int] = {}
+_consolidation_timers: dict[str, asyncio.Task] = {}
+_consolidation_locks: dict[str, asyncio.Lock] = {}
+# Messages already consolidated, counted from the start of the chat history.
+# _trimmed_messages counts those dropped from the front of the list since, so
+# the first unconsolidated index is watermark - trimmed, even across trims
+# that happen while a run is in flight.
+_consolidation_watermark: dict[str, int] = {}
+_trimmed_messages: dict[str, int] = {}
+
+
+def _trim_history(chat_id: str):
+    """Keep the last MAX_MESSAGES, recording how many were dropped."""
+    excess = len(conversations[chat_id]) - MAX_MESSAGES
+    if excess > 0:
+        conversations[chat_id] = conversations[chat_id][excess:]
+        _trimmed_messages[chat_id] = _trimmed_messages.get(chat_id, 0) + excess
+
+
+def _reset_history(chat_id: str, messages: list):
+    """Replace the chat history, keeping the watermark inside the new list.
+
+    Sanitizing may drop messages (usually the tail of an interrupted tool
+    loop); the watermark is clamped so it never points past the end.
+    """
+    conversations[chat_id] = messages
+    end = _trimmed_messages.get(chat_id, 0) + len(messages)
+    if _consolidation_watermark.get(chat_id, 0) > end:
+        _consolidation_watermark[chat_id] = end
+
+
+def _advance_watermark(chat_id: str, watermark: int):
+    """Mark messages up to `watermark` consolidated (clamped to the current history)."""
+    end = _trimmed_messages.get(chat_id, 0) + len(conversations.get(chat_id, []))
+    _consolidation_watermark[chat_id] = min(watermark, end)
+
+
+def _cancel_quiet_timer(chat_id: str):
+    timer = _consolidation_timers.pop(chat_id, None)
+    if timer:
+        timer.cancel()
+
+
+def _schedule_consolidation(chat_id: str):
+    """Coalesce consolidation triggers: run after N exchanges or a quiet period."""
+    _pending_exchanges[chat_id] = _pending_exchanges.get(chat_id, 0) + 1
+    _cancel_quiet_timer(chat_id)
+    if _pending_exchanges[chat_id] >= CONSOLIDATE_EVERY_EXCHANGES:
+        asyncio.create_task(_run_consolidation(chat_id))
+    else:
+        _consolidation_timers[chat_id] = asyncio.create_task(_consolidate_when_quiet(chat_id))
+
+
+async def _consolidate_when_quiet(chat_id: str):
+    await asyncio.sleep(CONSOLIDATE_QUIET_SECONDS)
+    # Unregister before running so a new message can't cancel a run in flight
+    _consolidation_timers.pop(chat_id, None)
+    await _run_consolidation(chat_id)
+
+
+async def _run_consolidation(chat_id: str):
+    """Run one consolidation, never two at once for the same chat."""
+    lock = _consolidation_locks.setdefault(chat_id, asyncio.Lock())
+    async with lock:
+        _pending_exchanges[chat_id] = 0
+        await _consolidate_memory(chat_id)
+
+
+def _unconsolidated_messages(chat_id: str) -> tuple[list, list, int]:
+    """Split the chat into (context, new, watermark): messages before and after
+    the watermark, and the watermark to store once `new` is consolidated."""
     messages = conversations.get(chat_id, [])
+    trimmed = _trimmed_messages.get(chat_id, 0)
+    start = max(0, _consolidation_watermark.get(chat_id, 0) - trimmed)
+    new = messages[start:][-CONSOLIDATE_MAX_MESSAGES:]
+    first_new = len(messages) - len(new)
+    context = messages[max(0, first_new - CONSOLIDATE_CONTEXT_MESSAGES):first_new]
+    return context, new, trimmed + len(messages)
 
-    # Extract text from last 30 messages (including tool use/results for context)
-    recent = messages[-30:]
-    text_parts = [_extract_text_from_message(m) for m in recent]
-    text_parts = [t for t in text_parts if t]
 
-    if len(text_parts) < 2:
+async def _consolidate_memory(chat_id: str):
+    """Background task: extract learnings from messages since the last run and patch memory via Sonnet."""
+    context_messages, new_messages, watermark = _unconsolidated_messages(chat_id)
+    if not new_messages:
+        return
+
+    text_parts = [_extract_text_from_message(m) for m in new_messages]
+    text_parts = [t for t in text_parts if t]
+    if not any(m["role"] == "user" and isinstance(m.get("content"), str) for m in new_messages):
+        # Nothing the user said since the last run (e.g. only tool traffic)
+        _advance_watermark(chat_id, watermark)
         return
 
     conversation_text = "\n".join(text_parts)
-    current_memory = get_memory_cached()
+    context_parts = [_extract_text_from_message(m) for m in context_messages]
+    context_text = "\n".join(t for t in context_parts if t)
+    # Fresh read: the patch must apply to the latest memory, not a cached copy
+    current_memory = await asyncio.to_thread(refresh_memory_cache)
+    if current_memory is None:
+        # The patch is applied to this text, so never build on a failed read
+        print("⚠️ Memoria no disponible, consolidación omitida")
+        return
 
     try:
         response = await asyncio.to_thread(
             client.messages.create,
             model="claude-sonnet-4-6",
-            max_tokens=4096,
+            max_tokens=2048,
             messages=[{
                 "role": "user",
                 "content": f"""Eres el sistema de memoria persistente de un asistente personal. Tu trabajo es CRÍTICO: si no guardas algo, el asistente no lo recordará mañana.
@@ -432,7 +567,10 @@ async def _consolidate_memory(chat_id: str):
 MEMORIA ACTUAL:
 {current_memory or "(vacía)"}
 
-CONVERSACIÓN RECIENTE:
+CONTEXTO PREVIO (ya procesado, NO lo vuelvas a guardar):
+{context_text or "(ninguno)"}
+
+CONVERSACIÓN RECIENTE (mensajes nuevos desde la última consolidación):
 {conversation_text}
 
 INSTRUCCIONES:
@@ -451,8 +589,8 @@ INSTRUCCIONES:
    - Reuniones: con quién, sobre qué, conclusiones
    - Fechas y plazos mencionados
 5. NUNCA borres información existente de la memoria a menos que el usuario la haya corregido explícitamente
-6. Integra lo nuevo con lo existente, actualizando datos que hayan cambiado
-7. Organiza en secciones claras con ##
+6. Si un dato existente ha cambiado, sustituye esa línea (no dupliques)
+7. Cada línea va en una de las secciones ## de abajo
 
 SECCIONES:
 ## Trayectoria profesional
@@ -464,18 +602,37 @@ SECCIONES:
 ## Decisiones recientes
 ## Contexto y notas
 
+FORMATO DE RESPUESTA — NO reescribas la memoria, responde SOLO con los cambios:
+## Nombre de la sección
++ línea nueva
+- línea existente (copiada exacta de la memoria actual)
++ línea que sustituye a la anterior
+
+Un "+" justo después de un "-" reemplaza esa línea. Incluye solo las secciones que cambian.
+
 Si NO hay absolutamente nada nuevo que añadir, responde SOLO: NO_UPDATE
-Si hay CUALQUIER cosa nueva (aunque parezca menor), responde con la memoria COMPLETA actualizada.
 IMPORTANTE: ante la duda, SIEMPRE actualiza. Es mejor guardar de más que perder información.""",
             }],
         )
         result = response.content[0].text.strip()
-        if result != "NO_UPDATE" and len(result) > 100:
-            await asyncio.to_thread(update_memory, result)
-            invalidate_memory_cache()
-            print(f"🧠 Memoria consolidada: {len(result)} chars")
-        else:
+        # The watermark only moves once the messages are reflected in memory:
+        # after a failed write (or an exception) they are retried next run
+        if result == "NO_UPDATE":
+            _advance_watermark(chat_id, watermark)
             print("🧠 Memoria: sin cambios")
+            return
+        new_memory, applied = apply_patch(current_memory, result)
+        if not applied:
+            print(f"🧠 Memoria: parche sin cambios aplicables ({len(result)} chars)")
+            return
+        written = await asyncio.to_thread(update_memory, new_memory)
+        if not written.startswith("✅"):
+            invalidate_memory_cache()
+            print(f"⚠️ {written}")
+            return
+        _advance_watermark(chat_id, watermark)
+        set_memory_cache(new_memory)
+        print(f"🧠 Memoria consolidada: {applied} cambios ({len(result)} chars de parche)")
     except Exception as e:
         print(f"⚠️ Error consolidando memoria: {e}")
 
@@ -589,14 +746,17 @@ async def _process_message_inner(update, context, user_message, chat_id):
             asyncio.create_task(_summarize_session(chat_id, prev_messages))
     _last_message_ts[chat_id] = now_ts
 
+    # A reply is coming: don't let the quiet timer fire in the middle of it
+    _cancel_quiet_timer(chat_id)
+
     # Clean any orphaned tool_use blocks before adding new message
-    conversations[chat_id] = _sanitize_messages(conversations[chat_id])
+    _reset_history(chat_id, _sanitize_messages(conversations[chat_id]))
     conversations[chat_id].append({"role": "user", "content": user_message})
     await context.bot.send_chat_action(chat_id=chat_id, action="typing")
 
     # RAG: auto-inject relevant documents into the system prompt
     rag_context = await asyncio.to_thread(get_relevant_context, user_message)
-    system_prompt = _build_system_prompt(extra_context=rag_context)
+    system_prompt = _build_system_prompt(extra_context=rag_context, query=user_message)
     messages = conversations[chat_id]
 
     try:
@@ -667,16 +827,17 @@ async def _process_message_inner(update, context, user_message, chat_id):
         await update.message.reply_text(f"⚠️ Error: {exc}")
     finally:
         # Trim to last MAX_MESSAGES and persist to disk
-        if len(conversations[chat_id]) > MAX_MESSAGES:
-            conversations[chat_id] = conversations[chat_id][-MAX_MESSAGES:]
+        _trim_history(chat_id)
         _save_conversations(conversations)
-        # Fire-and-forget memory consolidation (doesn't block the response)
-        asyncio.create_task(_consolidate_memory(chat_id))
+        # Debounced memory consolidation (doesn't block the response)
+        _schedule_consolidation(chat_id)
 
 
 async def clear_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = str(update.effective_chat.id)
     conversations[chat_id] = []
+    _trimmed_messages.pop(chat_id, None)
+    _consolidation_watermark.pop(chat_id, None)
     _save_conversations(conversations)
     await update.message.reply_text("🗑️ Historial borrado. Empezamos de cero.")
 
@@ -821,6 +982,13 @@ def main():
     app.add_handler(MessageHandler(filters.VOICE, handle_voice))
     app.add_handler(MessageHandler(filters.Document.ALL, handle_document))
 
+    # Summary rollup doesn't message anyone, so it runs regardless of TELEGRAM_CHAT_ID
+    app.job_queue.run_daily(
+        summary_rollup_job,
+        time=datetime.time(3, 30, 0, tzinfo=MADRID_TZ),
+    )
+    app.job_queue.run_repeating(summary_sync_job, interval=SUMMARY_SYNC_SECONDS, first=30)
+
     # Scheduled jobs (TEMPORARILY DISABLED — reactivate when needed)
     # if TELEGRAM_CHAT_ID:
     #     job_queue = app.job_queue
@@ -0,0 +1,170 @@
+"""
+Productivity analytics over the full Time Log and Tasks history.
+
+Entries and tasks are loaded from the local stores into column arrays, and
+each metric is one vectorized pass over them: a weeks × branches hours
+matrix, trends and deficits against config.BRANCH_HOURS, completion rates,
+and estimated-vs-logged accuracy.
+"""
+from datetime import datetime
+
+import numpy as np
+
+from config import BRANCH_HOURS, BRANCH_NAMES, TOTAL_WEEKLY_HOURS
+from tools.notion_tools import get_tasks
+from tools.time_log_store import time_log_store, week_start
+
+ROLLING_WEEKS = 4
+
+
+def _load_entries():
+    """Time Log entries as column arrays (only configured branches)."""
+    time_log_store.sync()
+    entries = [e for e in time_log_store.entries() if e["branch"] in BRANCH_HOURS]
+    branch_idx = {name: i for i, name in enumerate(BRANCH_NAMES)}
+    return {
+        "week": np.array(
+            [np.datetime64(week_start(e["date"]), "D") for e in entries], dtype="datetime64[D]"
+        ),
+        "branch": np.array([branch_idx[e["branch"]] for e in entries], dtype=np.int64),
+        "hours": np.array([e["hours"] for e in entries], dtype=np.float64),
+        "description": np.array([e["description"].strip().lower() for e in entries], dtype=object),
+    }
+
+
+def _load_tasks():
+    """Tasks as column arrays."""
+    tasks = get_tasks()
+    branch_idx = {name: i for i, name in enumerate(BRANCH_NAMES)}
+    return {
+        "branch": np.array([branch_idx.get(t["branch"], -1) for t in tasks], dtype=np.int64),
+        "done": np.array([t["status"] == "Done" for t in tasks], dtype=bool),
+        "estimated": np.array([t["estimated_hours"] or 0 for t in tasks], dtype=np.float64),
+        "due": np.array(
+            [t.get("due_date", "")[:10] or "NaT" for t in tasks], dtype="datetime64[D]"
+        ),
+        "title": np.array([t["title"].strip().lower() for t in tasks], dtype=object),
+    }
+
+
+def _weekly_matrix(entries: dict, weeks: int) -> tuple[np.ndarray, list]:
+    """Hours logged per (week, branch) for the last `weeks` complete ISO weeks.
+
+    The window never starts before the week of the first Time Log entry, so
+    weeks before logging began don't count as zero-hour weeks.
+    """
+    current = np.datetime64(week_start(datetime.now().strftime("%Y-%m-%d")), "D")
+    first = current - np.timedelta64(7 * weeks, "D")
+    # An empty Time Log has no history at all
+    first = max(first, entries["week"].min()) if entries["week"].size else current
+    weeks = max(int((current - first).astype(np.int64)) // 7, 0)
+    week_idx = (entries["week"] - first).astype(np.int64) // 7
+    in_window = (week_idx >= 0) & (week_idx < weeks)
+
+    matrix = np.zeros((weeks, len(BRANCH_NAMES)))
+    np.add.at(matrix, (week_idx[in_window], entries["branch"][in_window]), entries["hours"][in_window])
+    labels = [str(first + np.timedelta64(7 * i, "D")) for i in range(weeks)]
+    return matrix, labels
+
+
+def _slopes(matrix: np.ndarray) -> np.ndarray:
+    """Least-squares slope (hours/week per week) of every column at once."""
+    if matrix.shape[0] < 2:
+        return np.zeros(matrix.shape[1])
+    x = np.arange(matrix.shape[0], dtype=np.float64)
+    x -= x.mean()
+    denom = (x ** 2).sum()
+    return (x[:, None] * (matrix - matrix.mean(axis=0))).sum(axis=0) / denom
+
+
+def _estimate_accuracy(entries: dict, tasks: dict) -> dict:
+    """Logged ÷ estimated hours for Done tasks whose title matches a Time Log description."""
+    done = tasks["done"] & (tasks["estimated"] > 0) & (tasks["branch"] >= 0)
+    titles = tasks["title"][done]
+    if not titles.size or not entries["hours"].size:
+        return {"matched_tasks": 0}
+
+    # Sum logged hours per distinct description, then look up each task title
+    descriptions, inverse = np.unique(entries["description"], return_inverse=True)
+    logged_by_description = np.bincount(inverse, weights=entries["hours"])
+    pos = np.searchsorted(descriptions, titles)
+    pos = np.clip(pos, 0, len(descriptions) - 1)
+    matched = descriptions[pos] == titles
+    if not matched.any():
+        return {"matched_tasks": 0}
+
+    logged = logged_by_description[pos[matched]]
+    estimated = tasks["estimated"][done][matched]
+    branches = tasks["branch"][done][matched]
+    ratios = logged / estimated
+
+    per_branch = {}
+    counts = np.bincount(branches, minlength=len(BRANCH_NAMES))
+    ratio_sums = np.bincount(branches, weights=ratios, minlength=len(BRANCH_NAMES))
+    for i in np.flatnonzero(counts):
+        per_branch[BRANCH_NAMES[i]] = round(float(ratio_sums[i] / counts[i]), 2)
+    return {
+        "matched_tasks": int(matched.sum()),
+        "median_logged_vs_estimated": round(float(np.median(ratios)), 2),
+        "underestimated_share": round(float((ratios > 1.2).mean()), 2),
+        "by_branch": per_branch,
+    }
+
+
+def get_productivity_stats(weeks: int = 8) -> dict:
+    """Multi-week productivity summary, pre-aggregated for the weekly review.
+
+    All hours figures refer to the last `weeks` complete ISO weeks (the
+    current, unfinished week is excluded), or fewer if the Time Log is younger.
+    """
+    weeks = max(1, min(int(weeks), 52))
+    entries = _load_entries()
+    tasks = _load_tasks()
+
+    matrix, labels = _weekly_matrix(entries, weeks)
+    weeks = len(labels)
+    targets = np.array([BRANCH_HOURS[name] for name in BRANCH_NAMES], dtype=np.float64)
+
+    deficit = targets - matrix                             # per week, per branch
+    rolling = deficit[-ROLLING_WEEKS:].sum(axis=0)         # last N weeks
+    means = matrix.mean(axis=0) if weeks else np.zeros(len(BRANCH_NAMES))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        compliance = np.where(targets > 0, means / targets, 0.0)
+    slopes = _slopes(matrix)
+
+    def hours(value, digits: int = 1):
+        # No complete week logged yet: hours figures would be meaningless
+        return round(float(value), digits) if weeks else None
+
+    totals = np.bincount(tasks["branch"][tasks["branch"] >= 0], minlength=len(BRANCH_NAMES))
+    done = np.bincount(
+        tasks["branch"][(tasks["branch"] >= 0) & tasks["done"]], minlength=len(BRANCH_NAMES)
+    )
+    today = np.datetime64(datetime.now().strftime("%Y-%m-%d"), "D")
+    overdue_mask = (~tasks["done"]) & (tasks["due"] < today) & (tasks["branch"] >= 0)
+    overdue = np.bincount(tasks["branch"][overdue_mask], minlength=len(BRANCH_NAMES))
+
+    branches = {}
+    for i, name in enumerate(BRANCH_NAMES):
+        branches[name] = {
+            "target": float(targets[i]),
+            "avg_hours": hours(means[i]),
+            "compliance": hours(compliance[i], 2),
+            "trend_hours_per_week": hours(slopes[i], 2),
+            f"deficit_last_{min(ROLLING_WEEKS, weeks)}w": hours(rolling[i]),
+            "deficit_window": hours(deficit[:, i].sum()),
+            "tasks_done": int(done[i]),
+            "tasks_total": int(totals[i]),
+            "completion_rate": round(float(done[i] / totals[i]), 2) if totals[i] else None,
+            "overdue": int(overdue[i]),
+        }
+
+    weekly_totals = matrix.sum(axis=1)
+    return {
+        "weeks": labels,
+        "weekly_totals": [round(float(h), 1) for h in weekly_totals],
+        "weekly_target": TOTAL_WEEKLY_HOURS,
+        "avg_weekly_total": hours(weekly_totals.mean() if weeks else 0),
+        "branches": branches,
+        "estimate_accuracy": _estimate_accuracy(entries, tasks),
+    }
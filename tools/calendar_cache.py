@@ -0,0 +1,162 @@
+"""
+Local SQLite cache of the primary Google Calendar.
+
+Seeded once with a full events.list, then refreshed with sync tokens so only
+changed events come over the wire. Writes made through calendar_tools
+(block_calendar_time, delete_calendar_event) update the cache immediately.
+"""
+import os
+import json
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from googleapiclient.errors import HttpError
+
+from tools import calendar_tools
+from tools.google_auth import get_google_service
+from tools.sqlite_store import SqliteStore
+
+CACHE_DB = os.environ.get("CALENDAR_CACHE_DB", "calendar_cache.db")
+SYNC_INTERVAL_SECONDS = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT PRIMARY KEY,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL,
+    event TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_start ON events(start_ts);
+"""
+
+
+def _event_bounds(event: dict) -> tuple[float, float]:
+    """Start/end of an event as epoch seconds (all-day events at local midnight)."""
+    tz = ZoneInfo(calendar_tools.TIMEZONE)
+
+    def _ts(point: dict) -> float:
+        if "dateTime" in point:
+            return datetime.fromisoformat(point["dateTime"]).timestamp()
+        return datetime.strptime(point["date"], "%Y-%m-%d").replace(tzinfo=tz).timestamp()
+
+    return _ts(event["start"]), _ts(event["end"])
+
+
+class CalendarCache(SqliteStore):
+    """SQLite-backed copy of primary-calendar events, refreshed via sync tokens."""
+
+    SCHEMA = _SCHEMA
+
+    def __init__(self, path: str = CACHE_DB):
+        super().__init__(path)
+        self._last_sync = 0.0
+        self.full_syncs = 0
+        self.incremental_syncs = 0
+        self.changed_events = 0
+
+    # ── Sync ────────────────────────────────────
+
+    def sync(self, force: bool = False):
+        """Bring the cache up to date (at most once per SYNC_INTERVAL_SECONDS)."""
+        with self._lock:
+            if not force and time.time() - self._last_sync < SYNC_INTERVAL_SECONDS:
+                return
+            with closing(self._connect()) as conn, conn:
+                sync_token = self._get_state(conn, "sync_token")
+                if sync_token is None:
+                    self._full_sync(conn)
+                else:
+                    try:
+                        self._incremental_sync(conn, sync_token)
+                    except HttpError as e:
+                        if e.resp.status != 410:
+                            raise
+                        # Sync token invalidated by Google: start over
+                        self._full_sync(conn)
+            self._last_sync = time.time()
+
+    @staticmethod
+    def _fetch(**params) -> tuple[list, str | None]:
+        """Page through events.list; return all items and the final nextSyncToken.
+
+        Sync tokens cannot be combined with timeMin/timeMax/orderBy, so neither
+        the seed nor the incremental requests use them.
+        """
+        service = get_google_service("calendar", "v3")
+        items = []
+        page_token = None
+        while True:
+            kwargs = {"calendarId": "primary", "singleEvents": True, "maxResults": 2500, **params}
+            if page_token:
+                kwargs["pageToken"] = page_token
+            result = service.events().list(**kwargs).execute()
+            items.extend(result.get("items", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return items, result.get("nextSyncToken")
+
+    def _full_sync(self, conn: sqlite3.Connection):
+        items, sync_token = self._fetch()
+        conn.execute("DELETE FROM events")
+        for event in items:
+            self._upsert(conn, event)
+        if sync_token:
+            self._set_state(conn, "sync_token", sync_token)
+        self.full_syncs += 1
+
+    def _incremental_sync(self, conn: sqlite3.Connection, sync_token: str):
+        items, next_token = self._fetch(syncToken=sync_token)
+        for event in items:
+            self._upsert(conn, event)
+        self._set_state(conn, "sync_token", next_token or sync_token)
+        self.incremental_syncs += 1
+        self.changed_events += len(items)
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, event: dict):
+        if event.get("status") == "cancelled":
+            conn.execute("DELETE FROM events WHERE id = ?", (event["id"],))
+            return
+        start_ts, end_ts = _event_bounds(event)
+        conn.execute(
+            "INSERT OR REPLACE INTO events (id, start_ts, end_ts, event) VALUES (?, ?, ?, ?)",
+            (event["id"], start_ts, end_ts, json.dumps(event, ensure_ascii=False)),
+        )
+
+    # ── Write-through ───────────────────────────
+
+    def apply_insert(self, event: dict):
+        """Record an event we just created so reads don't need a round trip."""
+        with self._lock, closing(self._connect()) as conn, conn:
+            self._upsert(conn, event)
+
+    def apply_delete(self, event_id: str):
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+
+    # ── Queries ─────────────────────────────────
+
+    def events_between(self, time_min: datetime, time_max: datetime) -> list:
+        """Raw events overlapping [time_min, time_max), ordered by start."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT event FROM events WHERE start_ts < ? AND end_ts > ? ORDER BY start_ts",
+                (time_max.timestamp(), time_min.timestamp()),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self) -> dict:
+        with closing(self._connect()) as conn:
+            count = conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        return {
+            "events": count,
+            "full_syncs": self.full_syncs,
+            "incremental_syncs": self.incremental_syncs,
+            "changed_events": self.changed_events,
+            "seconds_since_sync": round(time.time() - self._last_sync, 1) if self._last_sync else None,
+        }
+
+
+calendar_cache = CalendarCache()
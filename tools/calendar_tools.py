@@ -1,5 +1,6 @@
 import os
-from datetime import datetime
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
 from tools.google_auth import get_google_service
 
 TIMEZONE = os.environ.get("TIMEZONE", "Europe/Madrid")
@@ -15,48 +16,254 @@ BRANCH_COLORS = {
 }
 
 
-def get_calendar_events(date: str = None) -> list:
-    """Return Google Calendar events for the given date (default: today)."""
+MAX_RANGE_DAYS = 62
+
+# Working hours used by the free-slot finder, e.g. "09:00-19:00"
+WORKING_HOURS = os.environ.get("WORKING_HOURS", "09:00-19:00")
+
+
+def _tz() -> ZoneInfo:
+    return ZoneInfo(TIMEZONE)
+
+
+def _parse_day(day: str) -> date:
+    return datetime.strptime(day, "%Y-%m-%d").date()
+
+
+def _event_summary(event: dict) -> dict:
+    start = event["start"].get("dateTime", event["start"].get("date", ""))
+    end = event["end"].get("dateTime", event["end"].get("date", ""))
+    return {
+        "id": event["id"],
+        "title": event.get("summary", "Sin título"),
+        "start": start,
+        "end": end,
+        "description": event.get("description", ""),
+    }
+
+
+def _event_days(event: dict) -> list:
+    """Local days (YYYY-MM-DD) an event touches, in the TIMEZONE zone."""
+    if "dateTime" in event["start"]:
+        start = datetime.fromisoformat(event["start"]["dateTime"]).astimezone(_tz())
+        end = datetime.fromisoformat(event["end"]["dateTime"]).astimezone(_tz())
+        first = start.date()
+        # An event ending exactly at midnight does not touch the next day
+        last = (end - timedelta(microseconds=1)).date() if end > start else first
+    else:
+        first = _parse_day(event["start"]["date"])
+        last = _parse_day(event["end"]["date"]) - timedelta(days=1)  # end date is exclusive
+        last = max(last, first)
+    return [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+
+
+def _list_events(time_min: str, time_max: str) -> list:
+    """All primary-calendar events overlapping [time_min, time_max), following pagination."""
     service = get_google_service("calendar", "v3")
+    items = []
+    page_token = None
+    while True:
+        params = {
+            "calendarId": "primary",
+            "timeMin": time_min,
+            "timeMax": time_max,
+            "singleEvents": True,
+            "orderBy": "startTime",
+            "timeZone": TIMEZONE,
+            "maxResults": 2500,
+        }
+        if page_token:
+            params["pageToken"] = page_token
+        result = service.events().list(**params).execute()
+        items.extend(result.get("items", []))
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            break
+    return items
+
+
+def _events_between(time_min: datetime, time_max: datetime) -> list:
+    """Events in the window from the local cache, or live if the cache is unavailable."""
+    from tools.calendar_cache import calendar_cache
+    try:
+        calendar_cache.sync()
+        return calendar_cache.events_between(time_min, time_max)
+    except Exception as e:
+        print(f"⚠️ Caché de Calendar no disponible, consultando Google: {e}")
+        return _list_events(time_min.isoformat(), time_max.isoformat())
+
+
+def get_calendar_events_range(start: str, end: str) -> dict:
+    """Return Google Calendar events from start to end (YYYY-MM-DD, both included),
+    fetched in one paginated request and grouped by local day."""
+    first, last = _parse_day(start), _parse_day(end)
+    if last < first:
+        raise ValueError(f"La fecha final ({end}) es anterior a la inicial ({start}).")
+    num_days = (last - first).days + 1
+    if num_days > MAX_RANGE_DAYS:
+        raise ValueError(f"Rango demasiado largo ({num_days} días, máximo {MAX_RANGE_DAYS}).")
+
+    tz = _tz()
+    time_min = datetime.combine(first, time.min, tzinfo=tz)
+    time_max = datetime.combine(last + timedelta(days=1), time.min, tzinfo=tz)
 
+    days = {(first + timedelta(days=i)).isoformat(): [] for i in range(num_days)}
+    for event in _events_between(time_min, time_max):
+        summary = _event_summary(event)
+        for day in _event_days(event):
+            if day in days:
+                days[day].append(summary)
+    return days
+
+
+def get_calendar_events(date: str = None) -> list:
+    """Return Google Calendar events for the given date (default: today)."""
     if not date:
-        date = datetime.now().strftime("%Y-%m-%d")
-
-    time_min = f"{date}T00:00:00Z"
-    time_max = f"{date}T23:59:59Z"
-
-    result = (
-        service.events()
-        .list(
-            calendarId="primary",
-            timeMin=time_min,
-            timeMax=time_max,
-            singleEvents=True,
-            orderBy="startTime",
-        )
-        .execute()
+        date = datetime.now(_tz()).strftime("%Y-%m-%d")
+    return get_calendar_events_range(date, date)[date]
+
+
+# ─────────────────────────────────────────────
+# Free/busy
+# ─────────────────────────────────────────────
+
+
+def _parse_local(value: str) -> datetime:
+    """Parse an ISO 8601 datetime; naive values are taken as TIMEZONE local time."""
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=_tz())
+
+
+def _event_interval(event: dict) -> tuple[datetime, datetime]:
+    def _point(point: dict) -> datetime:
+        if "dateTime" in point:
+            return datetime.fromisoformat(point["dateTime"])
+        return datetime.combine(_parse_day(point["date"]), time.min, tzinfo=_tz())
+
+    return _point(event["start"]), _point(event["end"])
+
+
+def _is_busy(event: dict) -> bool:
+    """Events marked 'free' (transparent) or declined by the user don't block time."""
+    if event.get("transparency") == "transparent":
+        return False
+    for attendee in event.get("attendees", []):
+        if attendee.get("self") and attendee.get("responseStatus") == "declined":
+            return False
+    return True
+
+
+def _merge_intervals(intervals: list) -> list:
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _free_between(window_start: datetime, window_end: datetime, busy: list, min_minutes: int) -> list:
+    """Gaps of at least min_minutes inside the window, given merged busy intervals."""
+    gaps = []
+    cursor = window_start
+    for busy_start, busy_end in busy:
+        if busy_end <= cursor:
+            continue
+        if busy_start >= window_end:
+            break
+        if busy_start > cursor:
+            gaps.append((cursor, busy_start))
+        cursor = max(cursor, busy_end)
+    if cursor < window_end:
+        gaps.append((cursor, window_end))
+    return [(a, b) for a, b in gaps if (b - a) >= timedelta(minutes=min_minutes)]
+
+
+def _working_window(day: date) -> tuple[datetime, datetime]:
+    start, end = (time.fromisoformat(t.strip()) for t in WORKING_HOURS.split("-"))
+    return (
+        datetime.combine(day, start, tzinfo=_tz()),
+        datetime.combine(day, end, tzinfo=_tz()),
     )
 
-    events = []
-    for event in result.get("items", []):
-        start = event["start"].get("dateTime", event["start"].get("date", ""))
-        end = event["end"].get("dateTime", event["end"].get("date", ""))
-        events.append(
+
+def find_free_slots(
+    start: str = None,
+    end: str = None,
+    min_minutes: int = 30,
+    include_weekends: bool = False,
+) -> dict:
+    """Return free slots within working hours per day, from start to end (default: today).
+
+    Computed locally from cached events: transparent and declined events are
+    ignored, busy intervals are merged, and past time today is excluded.
+    """
+    tz = _tz()
+    now = datetime.now(tz)
+    start = start or now.strftime("%Y-%m-%d")
+    first, last = _parse_day(start), _parse_day(end or start)
+    if last < first:
+        raise ValueError(f"La fecha final ({end}) es anterior a la inicial ({start}).")
+    num_days = (last - first).days + 1
+    if num_days > MAX_RANGE_DAYS:
+        raise ValueError(f"Rango demasiado largo ({num_days} días, máximo {MAX_RANGE_DAYS}).")
+
+    events = _events_between(
+        datetime.combine(first, time.min, tzinfo=tz),
+        datetime.combine(last + timedelta(days=1), time.min, tzinfo=tz),
+    )
+    busy = _merge_intervals([_event_interval(e) for e in events if _is_busy(e)])
+
+    # Round "now" up to the next quarter hour so today's slots start on a clean time
+    now_rounded = (now + timedelta(minutes=14)).replace(second=0, microsecond=0)
+    now_rounded -= timedelta(minutes=now_rounded.minute % 15)
+
+    slots = {}
+    for i in range(num_days):
+        day = first + timedelta(days=i)
+        if not include_weekends and day.weekday() >= 5:
+            continue
+        window_start, window_end = _working_window(day)
+        window_start = max(window_start, now_rounded)
+        slots[day.isoformat()] = [
             {
-                "id": event["id"],
-                "title": event.get("summary", "Sin título"),
-                "start": start,
-                "end": end,
-                "description": event.get("description", ""),
+                "start": a.astimezone(tz).strftime("%H:%M"),
+                "end": b.astimezone(tz).strftime("%H:%M"),
+                "minutes": int((b - a).total_seconds() // 60),
             }
-        )
-    return events
+            for a, b in _free_between(window_start, window_end, busy, min_minutes)
+        ]
+    return slots
+
+
+def find_conflicts(start_time: str, end_time: str) -> list:
+    """Return busy events overlapping the [start_time, end_time) interval."""
+    start, end = _parse_local(start_time), _parse_local(end_time)
+    conflicts = []
+    for event in _events_between(start, end):
+        if not _is_busy(event):
+            continue
+        event_start, event_end = _event_interval(event)
+        if event_start < end and event_end > start:
+            conflicts.append(_event_summary(event))
+    return conflicts
+
+
+def _update_cache(apply):
+    """Write-through to the local cache; a cache failure must not fail the write."""
+    from tools.calendar_cache import calendar_cache
+    try:
+        apply(calendar_cache)
+    except Exception as e:
+        print(f"⚠️ No se pudo actualizar la caché de Calendar: {e}")
 
 
 def delete_calendar_event(event_id: str) -> str:
     """Delete a Google Calendar event by its ID."""
     service = get_google_service("calendar", "v3")
     service.events().delete(calendarId="primary", eventId=event_id).execute()
+    _update_cache(lambda cache: cache.apply_delete(event_id))
     return f"✅ Evento eliminado del calendario."
 
 
@@ -66,11 +273,35 @@ def block_calendar_time(
     end_time: str,
     branch: str,
     notes: str = "",
+    allow_overlap: bool = False,
 ) -> str:
-    """Create a focused-work time block in Google Calendar."""
+    """Create a focused-work time block in Google Calendar.
+
+    Refuses to create the block if it overlaps a busy event, unless allow_overlap.
+    """
+    if not allow_overlap:
+        conflicts = find_conflicts(start_time, end_time)
+        if conflicts:
+            listing = "\n".join(
+                f"   • {c['title']} ({c['start']} → {c['end']})" for c in conflicts
+            )
+            return (
+                f"⚠️ El bloque '{title}' se solapa con:\n{listing}\n"
+                f"No se ha creado. Elige otro hueco (find_free_slots) o repite con allow_overlap=true."
+            )
+
     service = get_google_service("calendar", "v3")
+    event = _block_event(title, start_time, end_time, branch, notes)
+    created = service.events().insert(calendarId="primary", body=event).execute()
+    _update_cache(lambda cache: cache.apply_insert(created))
+    return (
+        f"✅ Bloque '{title}' creado en Google Calendar\n"
+        f"   {start_time} → {end_time} | Rama: {branch}"
+    )
+
 
-    event = {
+def _block_event(title: str, start_time: str, end_time: str, branch: str, notes: str = "") -> dict:
+    return {
         "summary": f"[{branch}] {title}",
         "description": f"Rama: {branch}\n{notes}".strip(),
         "start": {"dateTime": start_time, "timeZone": TIMEZONE},
@@ -78,8 +309,77 @@ def block_calendar_time(
         "colorId": BRANCH_COLORS.get(branch, "1"),
     }
 
-    created = service.events().insert(calendarId="primary", body=event).execute()
-    return (
-        f"✅ Bloque '{title}' creado en Google Calendar\n"
-        f"   {start_time} → {end_time} | Rama: {branch}"
-    )
+
+CALENDAR_BATCH_SIZE = 50  # calls per batch request (Google allows up to 1000)
+
+
+def block_calendar_times(blocks: list, allow_overlap: bool = False) -> list:
+    """Create several focused-work blocks with one Google batch request.
+
+    Blocks are validated against each other (and, unless allow_overlap, against
+    existing busy events) before anything is written. Returns one result per
+    input block, in order, with the created event ID or the error.
+    """
+    results: list = [None] * len(blocks)
+
+    def _fail(i: int, error: str):
+        results[i] = {"index": i, "title": blocks[i].get("title", ""), "ok": False, "error": error}
+
+    intervals = []
+    for i, block in enumerate(blocks):
+        try:
+            start, end = _parse_local(block["start_time"]), _parse_local(block["end_time"])
+        except (KeyError, ValueError) as e:
+            _fail(i, f"Bloque inválido: {e}")
+            continue
+        if not block.get("title") or not block.get("branch"):
+            _fail(i, "Faltan title o branch.")
+        elif end <= start:
+            _fail(i, "La hora de fin debe ser posterior a la de inicio.")
+        else:
+            intervals.append((start, end, i))
+
+    # Overlaps inside the request: sweep by start, remembering the latest end
+    intervals.sort()
+    valid = []
+    latest_end, latest_idx = None, None
+    for start, end, i in intervals:
+        if latest_end is not None and start < latest_end:
+            _fail(i, f"Se solapa con el bloque {latest_idx} de esta misma petición.")
+            continue
+        valid.append(i)
+        latest_end, latest_idx = end, i
+
+    if not allow_overlap:
+        for i in list(valid):
+            conflicts = find_conflicts(blocks[i]["start_time"], blocks[i]["end_time"])
+            if conflicts:
+                _fail(i, "Se solapa con: " + ", ".join(c["title"] for c in conflicts))
+                valid.remove(i)
+
+    def _callback(request_id, response, exception):
+        i = int(request_id)
+        if exception is not None:
+            _fail(i, str(exception))
+            return
+        results[i] = {
+            "index": i,
+            "title": blocks[i]["title"],
+            "ok": True,
+            "event_id": response["id"],
+            "start": blocks[i]["start_time"],
+            "end": blocks[i]["end_time"],
+        }
+        _update_cache(lambda cache: cache.apply_insert(response))
+
+    if valid:
+        service = get_google_service("calendar", "v3")
+        for chunk_start in range(0, len(valid), CALENDAR_BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=_callback)
+            for i in valid[chunk_start:chunk_start + CALENDAR_BATCH_SIZE]:
+                b = blocks[i]
+                event = _block_event(b["title"], b["start_time"], b["end_time"], b["branch"], b.get("notes", ""))
+                batch.add(service.events().insert(calendarId="primary", body=event), request_id=str(i))
+            batch.execute()
+
+    return results
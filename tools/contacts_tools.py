@@ -1,8 +1,8 @@
 import os
 from datetime import datetime
-from notion_client import Client
+from tools.notion_api import get_client, iter_query
 
-notion = Client(auth=os.environ.get("NOTION_TOKEN", ""))
+notion = get_client()
 CONTACTS_DB_ID = os.environ.get("NOTION_CONTACTS_DB_ID", "")
 
 
@@ -37,7 +37,7 @@ def add_contact(
     return f"✅ Contacto '{persona}' ({empresa}) añadido."
 
 
-def get_contacts(estado: str = None, dias_sin_contacto: int = None) -> list:
+def get_contacts(estado: str = None, dias_sin_contacto: int = None, limit: int = None) -> list:
     """Get LinkedIn contacts, optionally filtered by status or days since last contact."""
     filters = []
     if estado:
@@ -49,15 +49,13 @@ def get_contacts(estado: str = None, dias_sin_contacto: int = None) -> list:
 
     query_params = {
         "database_id": CONTACTS_DB_ID,
-        "page_size": 100,
         "sorts": [{"property": "Fecha próximo contacto", "direction": "ascending"}],
     }
     if filters:
         query_params["filter"] = {"and": filters} if len(filters) > 1 else filters[0]
 
-    results = notion.databases.query(**query_params)
     contacts = []
-    for page in results.get("results", []):
+    for page in iter_query(notion, limit=limit, **query_params):
         props = page["properties"]
         contact = {
             "id": page["id"],
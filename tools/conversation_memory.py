@@ -1,13 +1,38 @@
 import os
+import math
+import threading
 from datetime import datetime, timedelta
-from notion_client import Client
+from tools.notion_api import get_client, iter_query
+from tools.memory_sections import extract_terms
+from tools.summary_store import (
+    CONV_SUMMARIES_DB_ID,
+    LEVEL_MONTH,
+    LEVEL_SESSION,
+    LEVEL_WEEK,
+    LEVELS,
+    _read_page_body,
+    _summary_from_page,
+    summary_store,
+)
 
 
 def _notion():
-    return Client(auth=os.environ.get("NOTION_TOKEN", ""))
+    return get_client()
 
 
-CONV_SUMMARIES_DB_ID = os.environ.get("NOTION_CONV_SUMMARIES_DB_ID", "")
+# Sessions read straight from Notion while the local store is still empty
+COLD_START_SESSIONS = 5
+
+# Episodic memory injected into the system prompt
+EPISODIC_TOKEN_BUDGET = int(os.environ.get("EPISODIC_TOKEN_BUDGET", "2500"))
+RECENCY_HALF_LIFE_DAYS = 14
+RECENCY_WEIGHT = 0.6
+PEOPLE_WEIGHT = 1.0
+TOPIC_WEIGHT = 0.7
+
+_background_sync: threading.Thread = None
+_background_sync_lock = threading.Lock()
+_terms_cache: dict[str, dict] = {}
 
 
 def save_conversation_summary(
@@ -17,14 +42,19 @@ def save_conversation_summary(
     temas: list[str],
     personas: list[str],
     acciones: str,
+    level: str = LEVEL_SESSION,
+    date: str = None,
 ) -> str:
-    """Save a conversation session summary to the Notion database."""
+    """Save a conversation session summary (or a weekly/monthly digest) to the Notion database.
+
+    Digests pass their `level` and the start date of the period they cover.
+    """
     if not CONV_SUMMARIES_DB_ID:
         return "NOTION_CONV_SUMMARIES_DB_ID no configurado, resumen no guardado."
 
     properties = {
         "Título": {"title": [{"text": {"content": title[:100]}}]},
-        "Fecha": {"date": {"start": datetime.now().isoformat()}},
+        "Fecha": {"date": {"start": date or datetime.now().isoformat()}},
         "Duración (mensajes)": {"number": num_messages},
         "Temas": {"multi_select": [{"name": t[:100]} for t in temas[:10]]},
         "Personas mencionadas": {"multi_select": [{"name": p[:100]} for p in personas[:10]]},
@@ -33,6 +63,10 @@ def save_conversation_summary(
         },
     }
 
+    if level != LEVEL_SESSION:
+        # Sessions leave it empty so saving works before the property exists
+        properties["Nivel"] = {"select": {"name": level}}
+
     # Split summary into 2000-char blocks (Notion limit per rich_text block)
     chunks = [summary_text[i : i + 2000] for i in range(0, len(summary_text), 2000)]
     children = [
@@ -44,55 +78,175 @@ def save_conversation_summary(
         for chunk in chunks
     ]
 
-    _notion().pages.create(
+    page = _notion().pages.create(
         parent={"database_id": CONV_SUMMARIES_DB_ID},
         properties=properties,
         children=children[:100],
     )
+    try:
+        summary_store.put({
+            **_summary_from_page(page),
+            "last_edited_time": page.get("last_edited_time", ""),
+            "body": "\n".join(c for c in chunks[:100] if c.strip()) or "[Resumen vacío]",
+        })
+    except Exception as e:
+        print(f"⚠️ No se pudo indexar el resumen en local: {e}")
     return f"✅ Resumen '{title}' guardado."
 
 
-def get_recent_summaries(limit: int = 5) -> list[dict]:
-    """Get the N most recent conversation summaries with full body text."""
+def get_recent_summaries(limit: int = 5, level: str = None) -> list[dict]:
+    """Get the N most recent conversation summaries with full body text.
+
+    Bodies come from the local summary store when the page's last_edited_time
+    is unchanged; the rest are read from Notion concurrently. `level`
+    restricts the result to sessions or to one kind of digest.
+    """
     if not CONV_SUMMARIES_DB_ID:
         return []
 
-    notion = _notion()
-    results = notion.databases.query(
+    pages = []
+    # Filtered here rather than in Notion: "Nivel" may not exist yet
+    for page in iter_query(
+        _notion(),
+        limit=None if level else limit,
         database_id=CONV_SUMMARIES_DB_ID,
-        page_size=limit,
         sorts=[{"property": "Fecha", "direction": "descending"}],
-    )
+    ):
+        if level is None or _summary_from_page(page)["level"] == level:
+            pages.append(page)
+            if len(pages) >= limit:
+                break
 
-    summaries = []
-    for page in results.get("results", []):
-        props = page["properties"]
-        title_items = (props.get("Título") or {}).get("title", [])
-        title = "".join(t.get("plain_text", "") for t in title_items)
-        date = ((props.get("Fecha") or {}).get("date") or {}).get("start", "")
-        temas = [t["name"] for t in (props.get("Temas") or {}).get("multi_select", [])]
-
-        # Read page body for the full narrative
-        body = _read_page_body(notion, page["id"])
-
-        summaries.append({
-            "id": page["id"],
-            "title": title,
-            "date": date,
-            "temas": temas,
-            "summary_text": body,
-        })
-    return summaries
+    return [_as_recent(summary) for summary in summary_store.load(pages)]
+
+
+def _as_recent(summary: dict) -> dict:
+    """A stored summary in the shape returned to callers (body as summary_text)."""
+    return {
+        "id": summary["id"],
+        "title": summary["title"],
+        "date": summary["date"],
+        "level": summary["level"],
+        "temas": summary["temas"],
+        "personas": summary["personas"],
+        "summary_text": summary["body"],
+    }
+
+
+def get_layered_summaries(sessions: int = 5, weeks: int = 2, months: int = 2) -> list[dict]:
+    """Recent episodic memory at decreasing resolution, newest first.
+
+    The latest session summaries, then weekly digests for the weeks before
+    them, then monthly digests before those. The size stays bounded no matter
+    how long the history gets.
+
+    Served from the local store, which is backfilled in the background; only
+    a store without sessions yet (first deploy) waits for Notion, and then
+    just for the latest COLD_START_SESSIONS.
+    """
+    layered = summary_store.latest(LEVEL_SESSION, limit=sessions)
+    if not layered:
+        layered = get_recent_summaries(COLD_START_SESSIONS, level=LEVEL_SESSION)
+    else:
+        layered = [_as_recent(s) for s in layered]
+    sync_summary_store_in_background()
+
+    # Digests are dated by the first day of their period: stop before the
+    # period that holds the oldest entry already included
+    cutoff = _week_start(layered[-1]["date"]) if layered and layered[-1]["date"] else None
+    weekly = summary_store.latest(LEVEL_WEEK, limit=weeks, before=cutoff)
+    layered += [_as_recent(s) for s in weekly]
+    if weekly:
+        cutoff = weekly[-1]["date"]
+    cutoff = cutoff[:8] + "01" if cutoff else None
+    layered += [_as_recent(s) for s in summary_store.latest(LEVEL_MONTH, limit=months, before=cutoff)]
+    return layered
+
+
+def _week_start(day: str) -> str:
+    """Monday (YYYY-MM-DD) of the week containing `day`."""
+    d = datetime.strptime(day[:10], "%Y-%m-%d")
+    return (d - timedelta(days=d.weekday())).strftime("%Y-%m-%d")
+
+
+def select_relevant_summaries(summaries: list[dict], query: str, token_budget: int = None) -> list[dict]:
+    """Pick the summaries most relevant to `query` that fit in `token_budget`.
+
+    Scores each candidate locally by shared keywords (IDF-weighted, title
+    counts double), people and topics mentioned in the query, plus an
+    exponential recency decay. Returns the chosen ones newest first.
+    """
+    budget = token_budget or EPISODIC_TOKEN_BUDGET
+    query_terms = extract_terms(query or "")
+    now = datetime.now()
+
+    indexed = [(s, _summary_terms(s)) for s in summaries]
+    # Inverse document frequency of each query term across the candidates
+    idf = {}
+    for term in query_terms:
+        df = sum(1 for _, t in indexed if term in t["all"])
+        if df:
+            idf[term] = math.log(1 + len(indexed) / df)
+    max_idf = sum(idf.values()) or 1.0
+
+    scored = []
+    for summary, terms in indexed:
+        keyword = sum(idf[t] * (2 if t in terms["title"] else 1) for t in idf if t in terms["all"])
+        people = len(query_terms & terms["personas"])
+        topics = len(query_terms & terms["temas"])
+        try:
+            age_days = max((now - datetime.fromisoformat(summary["date"][:19])).days, 0)
+        except ValueError:
+            age_days = 365
+        recency = 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+        score = keyword / max_idf + PEOPLE_WEIGHT * people + TOPIC_WEIGHT * topics + RECENCY_WEIGHT * recency
+        scored.append((score, summary))
+
+    chosen, used = [], 0
+    for score, summary in sorted(scored, key=lambda x: x[0], reverse=True):
+        cost = (len(summary.get("title", "")) + len(summary.get("summary_text", ""))) // 4
+        if used + cost > budget:
+            continue
+        chosen.append(summary)
+        used += cost
+    return sorted(chosen, key=lambda s: s.get("date", ""), reverse=True)
+
+
+def _summary_terms(summary: dict) -> dict:
+    """Term sets of a summary, memoized by ID (summaries are write-once)."""
+    key = summary.get("id")
+    cached = _terms_cache.get(key)
+    if cached is not None:
+        return cached
+    title = extract_terms(summary.get("title", ""))
+    terms = {
+        "title": title,
+        "all": title | extract_terms(summary.get("summary_text", "")),
+        "temas": extract_terms(" ".join(summary.get("temas", []))),
+        "personas": extract_terms(" ".join(summary.get("personas", []))),
+    }
+    terms["all"] |= terms["temas"] | terms["personas"]
+    if len(_terms_cache) > 1000:
+        _terms_cache.clear()
+    _terms_cache[key] = terms
+    return terms
 
 
 def search_summaries(
-    tema: str = None, persona: str = None, dias: int = 30
+    tema: str = None, persona: str = None, dias: int = 30, limit: int = 20, nivel: str = None
 ) -> list[dict]:
-    """Search conversation summaries by topic, person, or date range."""
+    """Search conversation summaries by topic, person, date range or rollup level."""
     if not CONV_SUMMARIES_DB_ID:
         return []
 
     filters = []
+    if nivel == LEVEL_SESSION:
+        filters.append({"or": [
+            {"property": "Nivel", "select": {"equals": LEVEL_SESSION}},
+            {"property": "Nivel", "select": {"is_empty": True}},
+        ]})
+    elif nivel:
+        filters.append({"property": "Nivel", "select": {"equals": nivel}})
     if tema:
         filters.append({"property": "Temas", "multi_select": {"contains": tema}})
     if persona:
@@ -105,56 +259,63 @@ def search_summaries(
 
     query_params = {
         "database_id": CONV_SUMMARIES_DB_ID,
-        "page_size": 20,
         "sorts": [{"property": "Fecha", "direction": "descending"}],
     }
     if filters:
         query_params["filter"] = {"and": filters} if len(filters) > 1 else filters[0]
 
-    results = _notion().databases.query(**query_params)
-    summaries = []
-    for page in results.get("results", []):
-        props = page["properties"]
-        title_items = (props.get("Título") or {}).get("title", [])
-        title = "".join(t.get("plain_text", "") for t in title_items)
-        date = ((props.get("Fecha") or {}).get("date") or {}).get("start", "")
-        temas = [t["name"] for t in (props.get("Temas") or {}).get("multi_select", [])]
-        personas = [
-            p["name"]
-            for p in (props.get("Personas mencionadas") or {}).get("multi_select", [])
-        ]
-        acciones_rt = (props.get("Acciones generadas") or {}).get("rich_text", [])
-        acciones = "".join(a.get("plain_text", "") for a in acciones_rt)
-        summaries.append({
-            "id": page["id"],
-            "title": title,
-            "date": date,
-            "temas": temas,
-            "personas": personas,
-            "acciones": acciones,
-        })
-    return summaries
+    return [_summary_from_page(page) for page in iter_query(_notion(), limit=limit, **query_params)]
+
+
+def sync_summary_store(force: bool = False):
+    """Backfill the local summary store from Notion (at most once a minute).
+
+    The first run reads every summary; later runs only pages edited since the
+    last one.
+    """
+    if CONV_SUMMARIES_DB_ID:
+        summary_store.sync(force=force)
+
+
+def sync_summary_store_in_background():
+    """Start sync_summary_store() in a daemon thread, unless one is already running.
+
+    The first sync reads every summary body, so request paths never wait for it.
+    """
+    global _background_sync
+    if not CONV_SUMMARIES_DB_ID:
+        return
+    with _background_sync_lock:
+        if _background_sync and _background_sync.is_alive():
+            return
+        _background_sync = threading.Thread(target=_sync_quietly, daemon=True)
+        _background_sync.start()
+
+
+def _sync_quietly():
+    try:
+        sync_summary_store()
+    except Exception as e:
+        print(f"⚠️ No se pudo sincronizar los resúmenes, sigo con la copia local: {e}")
+
+
+def search_summaries_text(query: str, limit: int = 8) -> list[dict]:
+    """Ranked full-text search over summary titles, bodies, topics, people and actions.
+
+    Runs against the local FTS index, which is kept up to date in the
+    background; returns a snippet of each matching body.
+    """
+    sync_summary_store_in_background()
+    return summary_store.search(query, limit=limit)
 
 
 def get_summary_content(summary_id: str) -> str:
     """Get the full narrative body of a conversation summary."""
     if not CONV_SUMMARIES_DB_ID:
         return "[NOTION_CONV_SUMMARIES_DB_ID no configurado]"
+    # Summaries are write-once, so any stored copy is current
+    stored = summary_store.get(summary_id)
+    if stored:
+        return stored["body"]
     return _read_page_body(_notion(), summary_id)
 
-
-def _read_page_body(notion: Client, page_id: str) -> str:
-    """Read all text blocks from a Notion page body."""
-    blocks = notion.blocks.children.list(block_id=page_id)
-    lines = []
-    for block in blocks.get("results", []):
-        btype = block["type"]
-        if btype in (
-            "paragraph", "heading_1", "heading_2", "heading_3",
-            "bulleted_list_item", "numbered_list_item",
-        ):
-            rich_text = block[btype].get("rich_text", [])
-            text = "".join(rt["plain_text"] for rt in rich_text)
-            if text.strip():
-                lines.append(text)
-    return "\n".join(lines) or "[Resumen vacío]"
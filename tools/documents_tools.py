@@ -1,9 +1,9 @@
 import os
 import re
 from datetime import datetime
-from notion_client import Client
+from tools.notion_api import get_client, iter_query
 
-notion = Client(auth=os.environ.get("NOTION_TOKEN", ""))
+notion = get_client()
 DOCS_DB_ID = os.environ.get("NOTION_DOCS_DB_ID", "")
 
 _STOP_WORDS = {
@@ -61,7 +61,7 @@ def save_document(title: str, content: str, tags: list = None, source: str = "Ma
     return f"✅ Documento '{title}' guardado en Notion."
 
 
-def search_documents(query: str = "", tags: list = None) -> list:
+def search_documents(query: str = "", tags: list = None, limit: int = 20) -> list:
     """Search documents by title or tags."""
     filters = []
     if query:
@@ -78,15 +78,13 @@ def search_documents(query: str = "", tags: list = None) -> list:
 
     query_params = {
         "database_id": DOCS_DB_ID,
-        "page_size": 20,
         "sorts": [{"property": "Fecha", "direction": "descending"}],
     }
     if filters:
         query_params["filter"] = {"and": filters} if len(filters) > 1 else filters[0]
 
-    results = notion.databases.query(**query_params)
     docs = []
-    for page in results.get("results", []):
+    for page in iter_query(notion, limit=limit, **query_params):
         props = page["properties"]
         title_items = (props.get("Título") or {}).get("title", [])
         title = "".join(t.get("plain_text", "") for t in title_items)
@@ -0,0 +1,220 @@
+"""
+Local SQLite mirror of the Gmail primary inbox (message metadata only).
+
+Seeded once with a full listing, then kept current with users.history.list
+deltas from the stored historyId. read_emails answers from here locally;
+a full resync only happens when Gmail reports the historyId as expired.
+"""
+import os
+import json
+import sqlite3
+import time
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from googleapiclient.errors import HttpError
+
+from tools import gmail_tools
+from tools.google_auth import get_google_service
+from tools.sqlite_store import SqliteStore
+
+MIRROR_DB = os.environ.get("GMAIL_MIRROR_DB", "gmail_mirror.db")
+PRIMARY_QUERY = "in:inbox category:primary"
+PRIMARY_LABELS = ("INBOX", "CATEGORY_PERSONAL")
+SEED_MAX_MESSAGES = 500   # most recent primary-inbox messages kept on a full resync
+SYNC_INTERVAL_SECONDS = 60
+HISTORY_TYPES = ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    internal_date INTEGER NOT NULL,
+    labels TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    headers TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_date ON messages(internal_date DESC);
+"""
+
+
+def _labels_key(labels: list) -> str:
+    """Store labels as ',A,B,' so a single LIKE '%,X,%' matches one label."""
+    return "," + ",".join(labels) + ","
+
+
+def _is_primary(labels: list) -> bool:
+    return all(label in labels for label in PRIMARY_LABELS)
+
+
+def _epoch_ms(day: date) -> int:
+    return int(datetime.combine(day, datetime.min.time()).timestamp() * 1000)
+
+
+class GmailMirror(SqliteStore):
+    """SQLite-backed copy of primary-inbox metadata, synced via Gmail history."""
+
+    SCHEMA = _SCHEMA
+
+    def __init__(self, path: str = MIRROR_DB):
+        super().__init__(path)
+        self._last_sync = 0.0
+        self.full_syncs = 0
+        self.delta_syncs = 0
+
+    # ── Sync ────────────────────────────────────
+
+    def sync(self, force: bool = False):
+        """Bring the mirror up to date (at most once per SYNC_INTERVAL_SECONDS)."""
+        with self._lock:
+            if not force and time.time() - self._last_sync < SYNC_INTERVAL_SECONDS:
+                return
+            service = get_google_service("gmail", "v1")
+            headers_key = ",".join(gmail_tools.METADATA_HEADERS)
+            with closing(self._connect()) as conn, conn:
+                history_id = self._get_state(conn, "history_id")
+                if history_id is None or self._get_state(conn, "headers") != headers_key:
+                    self._full_sync(service, conn)
+                else:
+                    try:
+                        self._delta_sync(service, conn, history_id)
+                    except HttpError as e:
+                        if e.resp.status != 404:
+                            raise
+                        # historyId too old: Gmail no longer has those deltas
+                        self._full_sync(service, conn)
+                self._set_state(conn, "headers", headers_key)
+            self._last_sync = time.time()
+
+    def _full_sync(self, service, conn: sqlite3.Connection):
+        # Take the historyId before listing so nothing between the two is lost
+        history_id = service.users().getProfile(userId="me").execute()["historyId"]
+
+        ids = []
+        page_token = None
+        while len(ids) < SEED_MAX_MESSAGES:
+            params = {
+                "userId": "me",
+                "q": PRIMARY_QUERY,
+                "maxResults": min(500, SEED_MAX_MESSAGES - len(ids)),
+            }
+            if page_token:
+                params["pageToken"] = page_token
+            result = service.users().messages().list(**params).execute()
+            ids.extend(m["id"] for m in result.get("messages", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                break
+
+        metadata = gmail_tools._get_messages_metadata(service, ids)
+        conn.execute("DELETE FROM messages")
+        for message in metadata.values():
+            self._store(conn, message)
+        self._set_state(conn, "history_id", history_id)
+        self.full_syncs += 1
+
+    def _delta_sync(self, service, conn: sqlite3.Connection, history_id: str):
+        added: set = set()
+        deleted: set = set()
+        relabeled: dict = {}
+        page_token = None
+        while True:
+            params = {
+                "userId": "me",
+                "startHistoryId": history_id,
+                "historyTypes": HISTORY_TYPES,
+            }
+            if page_token:
+                params["pageToken"] = page_token
+            result = service.users().history().list(**params).execute()
+            for record in result.get("history", []):
+                for item in record.get("messagesAdded", []):
+                    added.add(item["message"]["id"])
+                for item in record.get("messagesDeleted", []):
+                    deleted.add(item["message"]["id"])
+                for item in record.get("labelsAdded", []) + record.get("labelsRemoved", []):
+                    # Each entry carries the message's full label list after the change
+                    relabeled[item["message"]["id"]] = item["message"].get("labelIds", [])
+            latest_history_id = result.get("historyId", history_id)
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                break
+
+        for msg_id in deleted:
+            conn.execute("DELETE FROM messages WHERE id = ?", (msg_id,))
+
+        to_fetch = added - deleted
+        for msg_id, labels in relabeled.items():
+            if msg_id in deleted or msg_id in to_fetch:
+                continue
+            known = conn.execute("SELECT 1 FROM messages WHERE id = ?", (msg_id,)).fetchone()
+            if not _is_primary(labels):
+                conn.execute("DELETE FROM messages WHERE id = ?", (msg_id,))
+            elif known:
+                conn.execute(
+                    "UPDATE messages SET labels = ? WHERE id = ?", (_labels_key(labels), msg_id)
+                )
+            else:
+                to_fetch.add(msg_id)  # moved into the primary inbox
+
+        if to_fetch:
+            metadata = gmail_tools._get_messages_metadata(service, list(to_fetch))
+            for message in metadata.values():
+                self._store(conn, message)
+
+        self._set_state(conn, "history_id", latest_history_id)
+        self.delta_syncs += 1
+
+    def _store(self, conn: sqlite3.Connection, message: dict):
+        labels = message.get("labelIds", [])
+        if not _is_primary(labels):
+            conn.execute("DELETE FROM messages WHERE id = ?", (message["id"],))
+            return
+        headers = {h["name"]: h["value"] for h in message["payload"].get("headers", [])}
+        conn.execute(
+            "INSERT OR REPLACE INTO messages (id, internal_date, labels, summary, headers) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                message["id"],
+                int(message.get("internalDate", 0)),
+                _labels_key(labels),
+                json.dumps(gmail_tools._email_summary(message), ensure_ascii=False),
+                json.dumps(headers, ensure_ascii=False),
+            ),
+        )
+
+    # ── Queries ─────────────────────────────────
+
+    def query(self, max_emails: int = 10, unread_only: bool = True, yesterday_only: bool = False) -> list:
+        """Return primary-inbox emails from the mirror, newest first."""
+        where = []
+        args: list = []
+        if unread_only:
+            where.append("labels LIKE ?")
+            args.append("%,UNREAD,%")
+        if yesterday_only:
+            today = date.today()
+            where.append("internal_date >= ? AND internal_date < ?")
+            args += [_epoch_ms(today - timedelta(days=1)), _epoch_ms(today)]
+
+        sql = "SELECT summary FROM messages"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY internal_date DESC LIMIT ?"
+        args.append(max_emails)
+
+        with closing(self._connect()) as conn:
+            return [json.loads(row[0]) for row in conn.execute(sql, args)]
+
+    def stats(self) -> dict:
+        with closing(self._connect()) as conn:
+            count = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            history_id = self._get_state(conn, "history_id")
+        return {
+            "messages": count,
+            "history_id": history_id,
+            "full_syncs": self.full_syncs,
+            "delta_syncs": self.delta_syncs,
+            "seconds_since_sync": round(time.time() - self._last_sync, 1) if self._last_sync else None,
+        }
+
+
+mirror = GmailMirror()
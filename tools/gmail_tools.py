@@ -1,36 +1,80 @@
+import os
+import re
+import time
 import base64
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from email.utils import parseaddr
+from googleapiclient.errors import HttpError
 from tools.google_auth import get_google_service
+from tools.sqlite_store import SqliteStore
+
+METADATA_HEADERS = [
+    "From", "Subject", "Date",
+    # Used only by the triage rules below
+    "List-Unsubscribe", "Precedence", "Auto-Submitted",
+]
+GMAIL_BATCH_SIZE = 50  # Gmail recommends at most 50 calls per batch request
 
 
 def _extract_plain_text(payload: dict) -> str:
-    """Recursively extract plain text body from a Gmail message payload."""
+    """Extract the plain text body from a Gmail message payload."""
+    return _find_plain_text(payload) or "[No se pudo extraer el cuerpo del correo]"
+
+
+def _find_plain_text(payload: dict) -> str:
+    """Recursively search a payload for its plain text body, skipping attachments."""
     mime = payload.get("mimeType", "")
 
-    if mime == "text/plain":
+    if mime == "text/plain" and not payload.get("filename"):
         data = payload.get("body", {}).get("data", "")
         if data:
             return base64.urlsafe_b64decode(data).decode("utf-8", errors="replace")
 
-    if "parts" in payload:
-        # Prefer text/plain part
-        for part in payload["parts"]:
-            if part.get("mimeType") == "text/plain":
-                data = part.get("body", {}).get("data", "")
-                if data:
-                    return base64.urlsafe_b64decode(data).decode(
-                        "utf-8", errors="replace"
-                    )
-        # Fallback: recurse into any part
-        for part in payload["parts"]:
-            result = _extract_plain_text(part)
-            if result:
-                return result
-
-    return "[No se pudo extraer el cuerpo del correo]"
-
-
-def read_emails(max_emails: int = 10, unread_only: bool = True, yesterday_only: bool = False) -> list:
-    """Return a list of emails from Gmail primary inbox (no newsletters or commercial emails)."""
+    parts = [p for p in payload.get("parts", []) if not p.get("filename")]
+    # Prefer text/plain part
+    for part in parts:
+        if part.get("mimeType") == "text/plain":
+            data = part.get("body", {}).get("data", "")
+            if data:
+                return base64.urlsafe_b64decode(data).decode("utf-8", errors="replace")
+    # Fallback: recurse into any part
+    for part in parts:
+        result = _find_plain_text(part)
+        if result:
+            return result
+
+    return ""
+
+
+def read_emails(
+    max_emails: int = 10,
+    unread_only: bool = True,
+    yesterday_only: bool = False,
+    only_needs_reply: bool = False,
+) -> list:
+    """Return a list of emails from Gmail primary inbox (no newsletters or commercial emails).
+
+    Answers from the local mirror (kept current via history deltas); falls back
+    to querying Gmail directly if the mirror is unavailable. Every email carries
+    a "triage" tag; only_needs_reply drops notifications and bulk mail.
+    """
+    from tools.gmail_mirror import mirror
+    try:
+        mirror.sync()
+        emails = mirror.query(max_emails, unread_only=unread_only, yesterday_only=yesterday_only)
+    except Exception as e:
+        print(f"⚠️ Mirror de Gmail no disponible, consultando Gmail: {e}")
+        emails = _read_emails_live(max_emails, unread_only, yesterday_only)
+    if only_needs_reply:
+        emails = [e for e in emails if e.get("triage") == TRIAGE_NEEDS_REPLY]
+    return emails
+
+
+def _read_emails_live(max_emails: int = 10, unread_only: bool = True, yesterday_only: bool = False) -> list:
+    """Query Gmail directly for the primary inbox (one list + batched metadata)."""
     import datetime as _dt
     service = get_google_service("gmail", "v1")
 
@@ -50,39 +94,261 @@ def read_emails(max_emails: int = 10, unread_only: bool = True, yesterday_only:
     )
 
     messages = result.get("messages", [])
+    ids = [msg["id"] for msg in messages]
+    metadata = _get_messages_metadata(service, ids)
+
     emails = []
-    for msg in messages:
-        message = (
-            service.users()
-            .messages()
-            .get(
-                userId="me",
-                id=msg["id"],
-                format="metadata",
-                metadataHeaders=["From", "Subject", "Date"],
-            )
-            .execute()
-        )
-        headers = {h["name"]: h["value"] for h in message["payload"]["headers"]}
-        emails.append(
-            {
-                "id": msg["id"],
-                "from": headers.get("From", ""),
-                "subject": headers.get("Subject", "(Sin asunto)"),
-                "date": headers.get("Date", ""),
-                "snippet": message.get("snippet", "")[:150],
-            }
-        )
+    for msg_id in ids:
+        message = metadata.get(msg_id)
+        if not message:
+            continue
+        emails.append(_email_summary(message))
     return emails
 
 
+def _email_summary(message: dict) -> dict:
+    """Shape a metadata-format Gmail message into the dict read_emails returns."""
+    headers = {h["name"]: h["value"] for h in message["payload"]["headers"]}
+    summary = {
+        "id": message["id"],
+        "from": headers.get("From", ""),
+        "subject": headers.get("Subject", "(Sin asunto)"),
+        "date": headers.get("Date", ""),
+        "snippet": message.get("snippet", "")[:150],
+    }
+    summary["triage"] = classify_email(summary, headers)
+    return summary
+
+
+# ─────────────────────────────────────────────
+# Triage (deterministic pre-filter before the LLM)
+# ─────────────────────────────────────────────
+
+TRIAGE_NEEDS_REPLY = "needs-reply"
+TRIAGE_NOTIFICATION = "notification"
+TRIAGE_BULK = "bulk"
+
+# Sender rules match the local part (before @) or the domain, never the display name
+_NOREPLY_LOCAL = re.compile(
+    r"^(no[-_.]?reply|do[-_.]?not[-_.]?reply|notifications?|alerts?|mailer-daemon|postmaster)\b",
+    re.IGNORECASE,
+)
+_BULK_LOCAL = re.compile(
+    r"^(newsletters?|news|marketing|promos?|promotions?|promociones|digest)\b",
+    re.IGNORECASE,
+)
+_BULK_DOMAIN = re.compile(
+    r"(^|\.)(mailchimp|mcsv|substack|sendgrid|hubspot(email)?)\.[a-z]+$",
+    re.IGNORECASE,
+)
+# Subject rules only sort mail that already has an automated-sender signal
+# into notification vs bulk; on their own they'd drop ordinary human mail
+_TRANSACTIONAL_SUBJECT = re.compile(
+    r"\b(factura|invoice|receipt|recibo|confirmaci[oó]n de (tu )?pedido|order confirmation|"
+    r"c[oó]digo de verificaci[oó]n|verification code|security alert|alerta de seguridad|"
+    r"password reset|restablecer (tu )?contraseña|tu suscripci[oó]n|your subscription)\b",
+    re.IGNORECASE,
+)
+_BULK_SUBJECT = re.compile(
+    r"newsletter|webinar|% ?(de )?descuento|% off|black friday|no te pierdas|don't miss",
+    re.IGNORECASE,
+)
+_LINKEDIN_DOMAIN = re.compile(r"(^|\.)linkedin\.com$", re.IGNORECASE)
+_LINKEDIN_DIRECT_MESSAGE = re.compile(
+    r"te ha enviado un mensaje|nuevo mensaje|sent you a (new )?message|new message from",
+    re.IGNORECASE,
+)
+
+
+def classify_email(email: dict, headers: dict) -> str:
+    """Tag an email as needs-reply, notification or bulk from sender, headers and subject."""
+    headers = {k.lower(): v for k, v in headers.items()}
+    sender = email.get("from", "")
+    subject = email.get("subject", "")
+    local, _, domain = parseaddr(sender)[1].rpartition("@")
+
+    # LinkedIn: only direct-message notifications are worth a reply
+    if _LINKEDIN_DOMAIN.search(domain):
+        if _LINKEDIN_DIRECT_MESSAGE.search(subject):
+            return TRIAGE_NEEDS_REPLY
+        return TRIAGE_NOTIFICATION
+
+    # List-Id alone is also set on Google Groups and team lists written by people
+    bulk_sender = (
+        bool(headers.get("list-unsubscribe"))
+        or headers.get("precedence", "").lower() in ("bulk", "list", "junk")
+        or bool(_BULK_LOCAL.search(local) or _BULK_DOMAIN.search(domain))
+    )
+    auto_submitted = headers.get("auto-submitted", "").lower()
+    automated = bool(auto_submitted and auto_submitted != "no") or bool(_NOREPLY_LOCAL.search(local))
+    if not (bulk_sender or automated):
+        return TRIAGE_NEEDS_REPLY
+
+    if _TRANSACTIONAL_SUBJECT.search(subject):
+        return TRIAGE_NOTIFICATION
+    if bulk_sender or _BULK_SUBJECT.search(subject):
+        return TRIAGE_BULK
+    return TRIAGE_NOTIFICATION
+
+
+def _metadata_request(service, msg_id: str):
+    return service.users().messages().get(
+        userId="me",
+        id=msg_id,
+        format="metadata",
+        metadataHeaders=METADATA_HEADERS,
+    )
+
+
+def _get_messages_metadata(service, ids: list) -> dict:
+    """Fetch metadata for many messages in Gmail batch requests, keyed by message ID.
+
+    One HTTP round trip per GMAIL_BATCH_SIZE messages instead of one per message.
+    Items the batch rejects (e.g. per-item rate limits) are retried one by one.
+    """
+    results: dict = {}
+    failed: list = []
+
+    def _callback(request_id, response, exception):
+        if exception is None:
+            results[request_id] = response
+        else:
+            failed.append(request_id)
+
+    for i in range(0, len(ids), GMAIL_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=_callback)
+        for msg_id in ids[i:i + GMAIL_BATCH_SIZE]:
+            batch.add(_metadata_request(service, msg_id), request_id=msg_id)
+        batch.execute()
+
+    for msg_id in failed:
+        try:
+            results[msg_id] = _metadata_request(service, msg_id).execute()
+        except HttpError as e:
+            if e.resp.status != 404:  # deleted since it was listed
+                raise
+    return results
+
+
+# ─────────────────────────────────────────────
+# Message body cache
+# ─────────────────────────────────────────────
+
+BODY_CACHE_DB = os.environ.get("GMAIL_BODY_CACHE_DB", "gmail_bodies.db")
+BODY_CACHE_MEMORY_BYTES = 2 * 1024 * 1024    # in-process LRU cap (approx., counted in chars)
+BODY_CACHE_DISK_BYTES = 50 * 1024 * 1024     # on-disk cap
+
+
+def _body_fields(depth: int = 5) -> str:
+    """Partial-response field mask: only MIME structure and inline body data.
+
+    Attachment parts have no inline data (only an attachmentId), and we never
+    call attachments.get, so attachments are never downloaded.
+    """
+    fields = "mimeType,filename,body/data"
+    for _ in range(depth):
+        fields = f"mimeType,filename,body/data,parts({fields})"
+    return f"payload({fields})"
+
+
+BODY_FIELDS = _body_fields()
+
+
+_BODY_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bodies (
+    id TEXT PRIMARY KEY,
+    body TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bodies_access ON bodies(last_access);
+"""
+
+
+class BodyCache(SqliteStore):
+    """Two-level cache of message bodies keyed by message ID.
+
+    Gmail messages are immutable, so entries never go stale; they are only
+    evicted (least recently used first) when a level exceeds its byte cap.
+    """
+
+    SCHEMA = _BODY_CACHE_SCHEMA
+
+    def __init__(self, path: str = BODY_CACHE_DB,
+                 memory_bytes: int = BODY_CACHE_MEMORY_BYTES,
+                 disk_bytes: int = BODY_CACHE_DISK_BYTES):
+        super().__init__(path)
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._memory_size = 0
+        self._memory_lock = threading.Lock()
+
+    def get(self, msg_id: str) -> str | None:
+        with self._memory_lock:
+            body = self._memory.get(msg_id)
+            if body is not None:
+                self._memory.move_to_end(msg_id)
+                return body
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT body FROM bodies WHERE id = ?", (msg_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE bodies SET last_access = ? WHERE id = ?", (time.time(), msg_id)
+            )
+        self._remember(msg_id, row[0])
+        return row[0]
+
+    def put(self, msg_id: str, body: str):
+        self._remember(msg_id, body)
+        size = len(body.encode("utf-8"))
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO bodies (id, body, size, last_access) VALUES (?, ?, ?, ?)",
+                (msg_id, body, size, time.time()),
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+            if total > self.disk_bytes:
+                self._evict_disk(conn, total)
+
+    def _evict_disk(self, conn: sqlite3.Connection, total: int):
+        evict = []
+        for msg_id, size in conn.execute("SELECT id, size FROM bodies ORDER BY last_access"):
+            if total <= self.disk_bytes:
+                break
+            evict.append((msg_id,))
+            total -= size
+        conn.executemany("DELETE FROM bodies WHERE id = ?", evict)
+
+    def _remember(self, msg_id: str, body: str):
+        size = len(body)
+        with self._memory_lock:
+            if msg_id in self._memory:
+                self._memory_size -= len(self._memory.pop(msg_id))
+            self._memory[msg_id] = body
+            self._memory_size += size
+            while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+                _, old = self._memory.popitem(last=False)
+                self._memory_size -= len(old)
+
+
+body_cache = BodyCache()
+
+
 def get_email_body(email_id: str) -> str:
-    """Return the full plain-text body of a Gmail message."""
+    """Return the full plain-text body of a Gmail message (cached, text parts only)."""
+    cached = body_cache.get(email_id)
+    if cached is not None:
+        return cached
+
     service = get_google_service("gmail", "v1")
     message = (
         service.users()
         .messages()
-        .get(userId="me", id=email_id, format="full")
+        .get(userId="me", id=email_id, format="full", fields=BODY_FIELDS)
         .execute()
     )
-    return _extract_plain_text(message["payload"])
+    body = _extract_plain_text(message["payload"])
+    body_cache.put(email_id, body)
+    return body
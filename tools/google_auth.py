@@ -1,9 +1,14 @@
 import os
 import json
 import base64
+import threading
+from datetime import datetime, timedelta, timezone
+import httplib2
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
 
 SCOPES = [
     "https://www.googleapis.com/auth/calendar",
@@ -11,9 +16,12 @@ SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
 ]
 
+# Refresh the access token this long before Google says it expires
+REFRESH_MARGIN_SECONDS = 300
 
-def get_credentials() -> Credentials:
-    """Build Google OAuth2 credentials from environment variables."""
+
+def _build_credentials() -> Credentials:
+    """Build (unrefreshed) Google OAuth2 credentials from environment variables."""
     refresh_token = os.environ.get("GOOGLE_REFRESH_TOKEN")
     if not refresh_token:
         raise RuntimeError(
@@ -33,7 +41,7 @@ def get_credentials() -> Credentials:
     client_secret = client_info["client_secret"]
     token_uri = client_info.get("token_uri", "https://oauth2.googleapis.com/token")
 
-    creds = Credentials(
+    return Credentials(
         token=None,
         refresh_token=refresh_token,
         token_uri=token_uri,
@@ -41,11 +49,120 @@ def get_credentials() -> Credentials:
         client_secret=client_secret,
         scopes=SCOPES,
     )
-    creds.refresh(Request())
-    return creds
 
 
-def get_google_service(service_name: str, version: str):
-    """Build and return an authenticated Google API service."""
+class CredentialManager:
+    """Process-wide holder of one Google access token.
+
+    The token is refreshed only when it is missing or close to expiry. Refreshes
+    are single-flight: concurrent callers (tools running via asyncio.to_thread)
+    wait on the same lock and reuse the token the first caller obtained.
+    """
+
+    def __init__(self, refresh_margin: int = REFRESH_MARGIN_SECONDS):
+        self._refresh_margin = timedelta(seconds=refresh_margin)
+        self._lock = threading.Lock()
+        self._creds: Credentials | None = None
+        self.hits = 0
+        self.refreshes = 0
+
+    def _is_fresh(self, creds: Credentials | None) -> bool:
+        if creds is None or not creds.token or creds.expiry is None:
+            return False
+        # google-auth stores expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now > self._refresh_margin
+
+    def get(self) -> Credentials:
+        """Return valid credentials, refreshing the access token only if needed."""
+        creds = self._creds
+        if self._is_fresh(creds):
+            with self._lock:
+                self.hits += 1
+            return creds
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._is_fresh(self._creds):
+                self.hits += 1
+                return self._creds
+            return self._refresh_locked()
+
+    def refresh(self) -> Credentials:
+        """Force a token refresh (used by the keep-alive job)."""
+        with self._lock:
+            return self._refresh_locked()
+
+    def _refresh_locked(self) -> Credentials:
+        creds = self._creds or _build_credentials()
+        creds.refresh(Request())
+        self._creds = creds
+        self.refreshes += 1
+        return creds
+
+    def stats(self) -> dict:
+        creds = self._creds
+        return {
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "expiry": creds.expiry.isoformat() if creds and creds.expiry else None,
+        }
+
+
+credential_manager = CredentialManager()
+
+
+def get_credentials() -> Credentials:
+    """Return the shared Google OAuth2 credentials (refreshed only near expiry)."""
+    return credential_manager.get()
+
+
+# ─────────────────────────────────────────────
+# Service registry
+# ─────────────────────────────────────────────
+
+# One Resource per (service, version), built once from the discovery documents
+# bundled with google-api-python-client (no network fetch at build time).
+_services: dict[tuple[str, str], object] = {}
+_services_lock = threading.Lock()
+
+# httplib2.Http is not thread-safe, and tools run from asyncio.to_thread, so
+# every thread gets its own authorized transport.
+_thread_local = threading.local()
+
+HTTP_TIMEOUT_SECONDS = 60
+
+
+def _thread_http() -> AuthorizedHttp:
+    """Return this thread's authorized HTTP transport."""
     creds = get_credentials()
-    return build(service_name, version, credentials=creds)
+    http = getattr(_thread_local, "http", None)
+    if http is None or http.credentials is not creds:
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS))
+        _thread_local.http = http
+    return http
+
+
+def _build_request(_http, *args, **kwargs) -> HttpRequest:
+    """requestBuilder for shared services: ignore the build-time transport."""
+    return HttpRequest(_thread_http(), *args, **kwargs)
+
+
+def get_google_service(service_name: str, version: str):
+    """Return the shared authenticated Google API service, building it on first use."""
+    key = (service_name, version)
+    service = _services.get(key)
+    if service is None:
+        with _services_lock:
+            service = _services.get(key)
+            if service is None:
+                service = build(
+                    service_name,
+                    version,
+                    http=_thread_http(),
+                    requestBuilder=_build_request,
+                    static_discovery=True,
+                    cache_discovery=False,
+                )
+                _services[key] = service
+    return service
@@ -0,0 +1,195 @@
+"""
+Section-level view of the memory document, and a local applier for the
+line patches produced by memory consolidation.
+
+Patch format (one block per `##` section touched):
+
+    ## Familia y vida personal
+    + línea nueva
+    - línea existente exacta
+    + línea que la sustituye
+
+`+` adds a line, `-` deletes one, and a `+` right after a `-` takes the
+deleted line's place (a replace). Sections that don't exist are created.
+Added lines take the bullet of the line they replace, or else the bullet
+style already used in the section (or the document, for new sections).
+
+select_sections() picks the sections relevant to a message so the system
+prompt doesn't grow with the whole memory.
+"""
+import re
+from functools import lru_cache
+
+from tools.stop_words import STOP_WORDS
+
+_BULLET_RE = re.compile(r"^[-*•]\s+")
+_PREFIX_RE = re.compile(r"^\s*[-*•]\s+")
+
+
+def _key(heading: str) -> str:
+    """Normalized section name: '## Contactos Clave ' -> 'contactos clave'."""
+    return re.sub(r"\s+", " ", heading.lstrip("#").strip()).lower()
+
+
+def _norm(line: str) -> str:
+    """Loose line identity for matching deletes: no bullet, case or spacing."""
+    return re.sub(r"\s+", " ", _BULLET_RE.sub("", line.strip())).lower()
+
+
+def _prefix(line: str) -> str:
+    """Indentation and bullet of a line: '  - Ana' -> '  - ', 'Ana' -> ''."""
+    m = _PREFIX_RE.match(line)
+    return m.group(0) if m else ""
+
+
+def _bullet_style(lines: list[str]) -> str | None:
+    """Bullet of the last bulleted line, unindented; '' for plain text, None if empty."""
+    content = [l.lstrip() for l in lines if l.strip()]
+    if not content:
+        return None
+    return next((_prefix(l) for l in reversed(content) if _prefix(l)), "")
+
+
+def parse_sections(memory: str) -> list[tuple[str, list[str]]]:
+    """Split memory into [(heading, lines)], in order.
+
+    Lines before the first `##` heading go in a section with heading "".
+    """
+    sections: list[tuple[str, list[str]]] = [("", [])]
+    for line in memory.split("\n"):
+        if line.startswith("## "):
+            sections.append((line.strip(), []))
+        else:
+            sections[-1][1].append(line)
+    if not sections[0][1] or not any(l.strip() for l in sections[0][1]):
+        sections.pop(0)
+    return sections
+
+
+def render_sections(sections: list[tuple[str, list[str]]]) -> str:
+    parts = []
+    for heading, lines in sections:
+        body = "\n".join(lines).strip("\n")
+        parts.append(f"{heading}\n{body}".strip("\n") if heading else body)
+    return "\n\n".join(p for p in parts if p)
+
+
+def apply_patch(memory: str, patch: str) -> tuple[str, int]:
+    """Apply a consolidation patch to `memory`.
+
+    Returns the new memory and the number of operations applied (0 means the
+    patch had nothing usable and the caller should not write).
+    """
+    sections = parse_sections(memory)
+    index = {_key(h): i for i, (h, _) in enumerate(sections) if h}
+    applied = 0
+    current = None          # lines list of the section being patched
+    replace_at = None       # position freed by the last '-', for a following '+'
+    replace_prefix = ""     # bullet of the line deleted there
+    # Style for new sections: the document's last bulleted section, else "- "
+    default_prefix = next(
+        (p for p in (_bullet_style(lines) for _, lines in reversed(sections)) if p), "- "
+    )
+
+    for raw in patch.split("\n"):
+        line = raw.rstrip()
+        if line.startswith("## "):
+            key = _key(line)
+            if key not in index:
+                sections.append((line.strip(), []))
+                index[key] = len(sections) - 1
+            current = sections[index[key]][1]
+            replace_at = None
+            continue
+        if current is None or len(line) < 2 or line[0] not in "+-" or line[1] != " ":
+            replace_at = None
+            continue
+
+        op, text = line[0], line[2:].strip()
+        if not text:
+            continue
+        if op == "-":
+            target = _norm(text)
+            pos = next((i for i, l in enumerate(current) if _norm(l) == target), None)
+            replace_at = pos
+            if pos is not None:
+                replace_prefix = _prefix(current.pop(pos))
+                applied += 1
+            continue
+
+        if any(_norm(l) == _norm(text) for l in current):
+            replace_at = None
+            continue        # already there
+        text = _BULLET_RE.sub("", text)
+        if replace_at is not None:
+            current.insert(replace_at, replace_prefix + text)
+            replace_at += 1
+        else:
+            style = _bullet_style(current)
+            # Append after the section's last non-blank line
+            end = len(current)
+            while end and not current[end - 1].strip():
+                end -= 1
+            current.insert(end, (default_prefix if style is None else style) + text)
+        applied += 1
+
+    return render_sections(sections), applied
+
+
+# ── Section-aware retrieval ─────────────────
+
+# Sections that always go in the system prompt (normalized headings)
+ALWAYS_SECTIONS = {"", "trayectoria profesional", "trabajo y proyectos activos"}
+
+# Extra trigger words for sections whose content alone rarely matches a query
+SECTION_HINTS = {
+    "familia y vida personal": "familia hijo hija hijos pareja mujer marido padre madre "
+                               "cumpleaños colegio vacaciones casa finde",
+    "contactos clave": "contacto persona reunión llamada email escribir presentar",
+    "situación personal": "salud ánimo cansado estrés dinero mudanza",
+    "preferencias y hábitos": "prefiero gusta horario rutina comida hábito",
+    "decisiones recientes": "decidimos decisión decidí acordamos",
+}
+
+_STEM = 5
+_ACCENTS = str.maketrans("áéíóúüàèìòù", "aeiouuaeiou")
+
+
+def extract_terms(text: str) -> set[str]:
+    """Accent-folded, stemmed (first 5 chars) words, minus stop words.
+
+    Words need 4+ letters, or 3+ if capitalized (names like Leo or Ana).
+    """
+    words = re.findall(r"[A-Za-zÁÉÍÓÚÜÑáéíóúüñ]{3,}", text)
+    return {
+        w.lower().translate(_ACCENTS)[:_STEM]
+        for w in words
+        if (len(w) >= 4 or w[0].isupper()) and w.lower() not in STOP_WORDS
+    }
+
+
+@lru_cache(maxsize=4)
+def _index(memory: str) -> tuple:
+    """Parsed sections with their term sets (cached per memory text)."""
+    indexed = []
+    for heading, lines in parse_sections(memory):
+        key = _key(heading)
+        terms = extract_terms(heading + "\n" + "\n".join(lines) + "\n" + SECTION_HINTS.get(key, ""))
+        indexed.append((heading, tuple(lines), key, frozenset(terms)))
+    return tuple(indexed)
+
+
+def select_sections(memory: str, query: str, keywords: str = "") -> tuple[str, list[str]]:
+    """Memory restricted to the always-on sections plus those matching `query`
+    or `keywords` (e.g. the titles of the documents RAG retrieved).
+
+    Returns the selected text and the headings that were left out.
+    """
+    query_terms = extract_terms(query) | extract_terms(keywords)
+    selected, omitted = [], []
+    for heading, lines, key, terms in _index(memory):
+        if key in ALWAYS_SECTIONS or query_terms & terms:
+            selected.append((heading, list(lines)))
+        else:
+            omitted.append(heading)
+    return render_sections(selected), omitted
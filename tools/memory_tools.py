@@ -1,10 +1,39 @@
 import os
+import difflib
+import hashlib
+import sqlite3
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from notion_client import Client
+from contextlib import closing
+from tools.notion_api import get_client
+from tools.sqlite_store import SqliteStore
+
+BLOCK_MAP_DB = os.environ.get("MEMORY_BLOCK_MAP_DB", "memory_blocks.db")
+
+# One writer at a time: the agent tool and background consolidation both
+# diff against the same block map, and interleaved inserts/deletes would
+# duplicate or lose blocks
+_write_lock = threading.Lock()
+
+_BLOCK_MAP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    page_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    block_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (page_id, position)
+);
+CREATE TABLE IF NOT EXISTS pages (
+    page_id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    last_edited_time TEXT NOT NULL
+);
+"""
 
 
 def _notion():
-    return Client(auth=os.environ.get("NOTION_TOKEN"))
+    return get_client()
 
 
 def get_memory() -> str:
@@ -40,57 +69,201 @@ def get_memory() -> str:
 def update_memory(new_content: str) -> str:
     """Replace the agent's memory page with updated content.
 
-    Uses chunked paragraph blocks (max 2000 chars each) to minimize API calls.
-    Deletes old blocks in parallel for speed.
+    Diffs the new content against a local map of the page's blocks (IDs and
+    content hashes) and only updates, inserts or deletes the blocks that
+    changed. Writing identical content makes no API calls.
     """
     page_id = os.environ.get("NOTION_MEMORY_PAGE_ID", "")
     if not page_id:
         return "Error: NOTION_MEMORY_PAGE_ID no configurado."
+    with _write_lock:
+        return _update_memory(page_id, new_content)
+
+
+def _update_memory(page_id: str, new_content: str) -> str:
     try:
-        notion = _notion()
+        chunks = _chunk_content(new_content)
+        if block_map.content_hash(page_id) == _hash("\n".join(chunks)):
+            return "✅ Memoria sin cambios."
 
-        # Collect ALL block IDs (paginated)
-        block_ids = []
-        cursor = None
-        while True:
-            params = {"block_id": page_id, "page_size": 100}
-            if cursor:
-                params["start_cursor"] = cursor
-            blocks = notion.blocks.children.list(**params)
-            block_ids.extend(b["id"] for b in blocks["results"])
-            if not blocks.get("has_more"):
-                break
-            cursor = blocks["next_cursor"]
+        notion = _notion()
+        last_edited = notion.pages.retrieve(page_id=page_id)["last_edited_time"]
+        old = block_map.blocks(page_id, last_edited)
+        if old is None:
+            # Map missing or page edited elsewhere since our last write: re-read it
+            old = _list_blocks(notion, page_id)
 
-        # Delete all blocks in parallel (10 concurrent threads)
-        if block_ids:
-            with ThreadPoolExecutor(max_workers=10) as pool:
-                futures = [pool.submit(notion.blocks.delete, block_id=bid) for bid in block_ids]
-                for f in as_completed(futures):
-                    f.result()  # raise if any failed
-
-        # Write new content as chunked paragraphs (max 2000 chars each)
-        # This minimizes the number of blocks created (fewer API calls)
-        children = []
-        chunk = ""
-        for line in new_content.split("\n"):
-            if len(chunk) + len(line) + 1 > 1900:
-                if chunk.strip():
-                    children.append(_make_block(chunk.strip()))
-                chunk = line + "\n"
-            else:
-                chunk += line + "\n"
-        if chunk.strip():
-            children.append(_make_block(chunk.strip()))
-
-        for i in range(0, len(children), 100):
-            notion.blocks.children.append(block_id=page_id, children=children[i:i+100])
-
-        return "✅ Memoria actualizada."
+        new_blocks, changed = _apply_diff(notion, page_id, old, chunks)
+        last_edited = notion.pages.retrieve(page_id=page_id)["last_edited_time"]
+        block_map.save(page_id, new_blocks, _hash("\n".join(chunks)), last_edited)
+        return f"✅ Memoria actualizada ({changed} bloques modificados)."
     except Exception as e:
+        block_map.clear()
         return f"Error actualizando memoria: {e}"
 
 
+def _hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _chunk_content(content: str) -> list[str]:
+    """Split memory into paragraph-sized chunks (max ~1900 chars each).
+
+    Every heading line starts a new chunk so an edit in one section never
+    shifts the chunk boundaries of the others.
+    """
+    chunks = []
+    chunk = ""
+    for line in content.split("\n"):
+        if chunk.strip() and (line.lstrip().startswith("#") or len(chunk) + len(line) + 1 > 1900):
+            chunks.append(chunk.strip())
+            chunk = ""
+        chunk += line + "\n"
+    if chunk.strip():
+        chunks.append(chunk.strip())
+    return chunks
+
+
+def _list_blocks(notion, page_id: str) -> list[dict]:
+    """All top-level blocks of a page as {id, type, hash} (paginated)."""
+    result = []
+    cursor = None
+    while True:
+        params = {"block_id": page_id, "page_size": 100}
+        if cursor:
+            params["start_cursor"] = cursor
+        blocks = notion.blocks.children.list(**params)
+        for block in blocks["results"]:
+            btype = block["type"]
+            rich_text = (block.get(btype) or {}).get("rich_text", [])
+            text = "".join(rt.get("plain_text", "") for rt in rich_text)
+            result.append({"id": block["id"], "type": btype, "hash": _hash(text)})
+        if not blocks.get("has_more"):
+            return result
+        cursor = blocks["next_cursor"]
+
+
+def _apply_diff(notion, page_id: str, old: list[dict], chunks: list[str]) -> tuple[list[dict], int]:
+    """Turn the old block list into `chunks` with the fewest block writes.
+
+    Returns the resulting block list and the number of blocks touched.
+    """
+    new_hashes = [_hash(c) for c in chunks]
+    matcher = difflib.SequenceMatcher(a=[b["hash"] for b in old], b=new_hashes, autojunk=False)
+    result: list[dict] = []
+    writes = []     # updates/deletes: independent, run in parallel
+    changed = 0
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            result.extend(old[i1:i2])
+            continue
+        olds, news = old[i1:i2], list(range(j1, j2))
+        # Edit paragraph blocks in place where possible
+        while olds and news and olds[0]["type"] == "paragraph":
+            block, j = olds.pop(0), news.pop(0)
+            writes.append((notion.blocks.update, {
+                "block_id": block["id"],
+                "paragraph": _make_block(chunks[j])["paragraph"],
+            }))
+            result.append({"id": block["id"], "type": "paragraph", "hash": new_hashes[j]})
+            changed += 1
+        for block in olds:
+            writes.append((notion.blocks.delete, {"block_id": block["id"]}))
+            changed += 1
+        if news and not result and i2 < len(old):
+            # Notion can only insert *after* a block; with nothing kept in
+            # front of the new blocks, rewrite the page instead.
+            return _rewrite(notion, page_id, old, chunks)
+        if news:
+            after = result[-1]["id"] if result else None
+            result.extend(_insert_after(notion, page_id, after, [chunks[j] for j in news]))
+            changed += len(news)
+    _run_parallel(writes)
+    return result, changed
+
+
+def _rewrite(notion, page_id: str, old: list[dict], chunks: list[str]) -> tuple[list[dict], int]:
+    """Delete every block and append `chunks` from scratch."""
+    _run_parallel([(notion.blocks.delete, {"block_id": b["id"]}) for b in old])
+    return _insert_after(notion, page_id, None, chunks), len(old) + len(chunks)
+
+
+def _insert_after(notion, page_id: str, after: str | None, chunks: list[str]) -> list[dict]:
+    """Append paragraph blocks after block `after` (or at the end) and map them."""
+    inserted = []
+    for i in range(0, len(chunks), 100):
+        batch = chunks[i:i + 100]
+        params = {"block_id": page_id, "children": [_make_block(c) for c in batch]}
+        if after:
+            params["after"] = after
+        response = notion.blocks.children.append(**params)
+        for block, chunk in zip(response["results"], batch):
+            inserted.append({"id": block["id"], "type": "paragraph", "hash": _hash(chunk)})
+        after = inserted[-1]["id"]
+    return inserted
+
+
+def _run_parallel(calls: list):
+    if not calls:
+        return
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        futures = [pool.submit(fn, **kwargs) for fn, kwargs in calls]
+        for f in as_completed(futures):
+            f.result()  # raise if any failed
+
+
+class BlockMap(SqliteStore):
+    """Local record of the memory page's blocks, as last written by update_memory."""
+
+    SCHEMA = _BLOCK_MAP_SCHEMA
+
+    def __init__(self, path: str = BLOCK_MAP_DB):
+        super().__init__(path)
+
+    def _page_row(self, conn: sqlite3.Connection, page_id: str):
+        return conn.execute(
+            "SELECT content_hash, last_edited_time FROM pages WHERE page_id = ?", (page_id,)
+        ).fetchone()
+
+    def content_hash(self, page_id: str) -> str | None:
+        with self._lock, closing(self._connect()) as conn:
+            row = self._page_row(conn, page_id)
+        return row[0] if row else None
+
+    def blocks(self, page_id: str, last_edited_time: str) -> list[dict] | None:
+        """The mapped blocks, or None if the page changed since we wrote it."""
+        with self._lock, closing(self._connect()) as conn:
+            row = self._page_row(conn, page_id)
+            if not row or row[1] != last_edited_time:
+                return None
+            rows = conn.execute(
+                "SELECT block_id, type, hash FROM blocks WHERE page_id = ? ORDER BY position",
+                (page_id,),
+            ).fetchall()
+        return [{"id": r[0], "type": r[1], "hash": r[2]} for r in rows]
+
+    def save(self, page_id: str, blocks: list[dict], content_hash: str, last_edited_time: str):
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM blocks WHERE page_id = ?", (page_id,))
+            conn.executemany(
+                "INSERT INTO blocks (page_id, position, block_id, type, hash) VALUES (?, ?, ?, ?, ?)",
+                [(page_id, i, b["id"], b["type"], b["hash"]) for i, b in enumerate(blocks)],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (page_id, content_hash, last_edited_time) VALUES (?, ?, ?)",
+                (page_id, content_hash, last_edited_time),
+            )
+
+    def clear(self):
+        """Forget everything (after a failed write the page state is unknown)."""
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM blocks")
+            conn.execute("DELETE FROM pages")
+
+
+block_map = BlockMap()
+
+
 def _make_block(text: str) -> dict:
     """Create a Notion paragraph block."""
     return {
@@ -0,0 +1,166 @@
+"""
+Shared helpers for talking to the Notion API from the tools modules.
+
+Every module talks to Notion through the single client returned by
+get_client(): one connection pool, one token bucket sized to Notion's rate
+limit, retries that honour Retry-After, and per-endpoint counters. Rate
+limits (429) are retried on every call; 5xx and timeouts only on calls that
+are safe to repeat, since Notion may already have applied a failed create.
+"""
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from notion_client import Client
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+
+def iter_query(client, limit: int = None, page_size: int = 100, **params):
+    """Yield the rows of a databases.query, following has_more/next_cursor.
+
+    Pages are requested lazily, so a caller that stops early (or passes
+    `limit`) never reads more of the database than it needs.
+    """
+    cursor = None
+    yielded = 0
+    while True:
+        size = page_size if limit is None else min(page_size, limit - yielded)
+        query = {**params, "page_size": size}
+        if cursor:
+            query["start_cursor"] = cursor
+        result = client.databases.query(**query)
+        for page in result.get("results", []):
+            yield page
+            yielded += 1
+            if limit is not None and yielded >= limit:
+                return
+        if not result.get("has_more"):
+            return
+        cursor = result.get("next_cursor")
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Notion allows an average of 3 requests per second per integration
+NOTION_RATE_LIMIT = 3
+MAX_RETRIES = 4
+RATE_LIMITED = 429
+# Retried only for idempotent calls: the write may have gone through anyway
+TRANSIENT_STATUSES = {500, 502, 503, 504}
+
+_ID_RE = re.compile(r"[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}", re.I)
+
+
+def _endpoint(method: str, path: str) -> str:
+    """'POST databases/<uuid>/query' -> 'POST databases/:id/query'."""
+    return f"{method.upper()} {_ID_RE.sub(':id', path.strip('/'))}"
+
+
+def _idempotent(endpoint: str) -> bool:
+    """Whether repeating the call can't duplicate anything.
+
+    Reads, queries, updates and deletes are safe; pages.create (POST pages)
+    and blocks.children.append (PATCH blocks/:id/children) are not.
+    """
+    method, path = endpoint.split(" ", 1)
+    if method in ("GET", "DELETE"):
+        return True
+    if method == "POST":
+        return path.endswith("/query") or path == "search"
+    if method == "PATCH":
+        return not path.endswith("/children")
+    return False
+
+
+class ThrottledClient(Client):
+    """notion_client.Client that throttles, retries and counts every request.
+
+    All endpoint helpers (pages.create, databases.query, ...) funnel through
+    Client.request, so overriding it covers the whole API surface.
+    """
+
+    def __init__(self, *args, rate: float = NOTION_RATE_LIMIT, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bucket = TokenBucket(rate=rate)
+        self._stats_lock = threading.Lock()
+        self.calls: Counter = Counter()
+        self.retries: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def request(self, path: str, method: str, *args, **kwargs):
+        endpoint = _endpoint(method, path)
+        idempotent = _idempotent(endpoint)
+        for attempt in range(MAX_RETRIES + 1):
+            self.bucket.acquire()
+            self._count(self.calls, endpoint)
+            try:
+                return super().request(path, method, *args, **kwargs)
+            except (HTTPResponseError, RequestTimeoutError) as e:
+                status = getattr(e, "status", None)
+                transient = isinstance(e, RequestTimeoutError) or status in TRANSIENT_STATUSES
+                retryable = status == RATE_LIMITED or (transient and idempotent)
+                if not retryable or attempt == MAX_RETRIES:
+                    self._count(self.errors, endpoint)
+                    raise
+                self._count(self.retries, endpoint)
+                time.sleep(self._retry_delay(e, attempt))
+
+    @staticmethod
+    def _retry_delay(error: Exception, attempt: int) -> float:
+        headers = getattr(error, "headers", None) or {}
+        try:
+            return max(float(headers.get("retry-after")), 0)
+        except (TypeError, ValueError):
+            return min(2 ** attempt, 30)
+
+    def _count(self, counter: Counter, endpoint: str):
+        with self._stats_lock:
+            counter[endpoint] += 1
+
+    def stats(self) -> dict:
+        """Calls, retries and errors per endpoint since startup."""
+        with self._stats_lock:
+            return {
+                "calls": dict(self.calls),
+                "retries": dict(self.retries),
+                "errors": dict(self.errors),
+                "total_calls": sum(self.calls.values()),
+            }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> ThrottledClient:
+    """The process-wide Notion client (created on first use)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ThrottledClient(auth=os.environ.get("NOTION_TOKEN", ""))
+    return _client
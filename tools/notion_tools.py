@@ -1,8 +1,9 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from notion_client import Client
+from tools.notion_api import NOTION_RATE_LIMIT, get_client, iter_query
 
-notion = Client(auth=os.environ.get("NOTION_TOKEN", ""))
+notion = get_client()
 
 TASKS_DB_ID = os.environ.get("NOTION_TASKS_DB_ID", "")
 NOTES_DB_ID = os.environ.get("NOTION_NOTES_DB_ID", "")
@@ -17,15 +18,14 @@ def _get_text(prop) -> str:
     return "".join(item.get("plain_text", "") for item in items)
 
 
-def create_task(
+def _task_properties(
     title: str,
     branch: str,
     priority: str,
     estimated_hours: float,
     due_date: str = None,
     notes: str = "",
-) -> str:
-    """Create a task in the Notion Tasks database."""
+) -> dict:
     properties = {
         "Name": {"title": [{"text": {"content": title}}]},
         "Branch": {"select": {"name": branch}},
@@ -37,25 +37,93 @@ def create_task(
         properties["Due Date"] = {"date": {"start": due_date}}
     if notes:
         properties["Notes"] = {"rich_text": [{"text": {"content": notes}}]}
+    return properties
 
-    notion.pages.create(
+
+def create_task(
+    title: str,
+    branch: str,
+    priority: str,
+    estimated_hours: float,
+    due_date: str = None,
+    notes: str = "",
+) -> str:
+    """Create a task in the Notion Tasks database."""
+    page = notion.pages.create(
         parent={"database_id": TASKS_DB_ID},
-        properties=properties,
+        properties=_task_properties(title, branch, priority, estimated_hours, due_date, notes),
     )
+    _mirror_task(page)
     return f"✅ Tarea '{title}' creada en '{branch}' (prioridad: {priority}, ~{estimated_hours}h)"
 
 
-def get_tasks(branch: str = None, status: str = None) -> list:
-    """Query tasks from Notion, optionally filtered by branch and/or status."""
+def create_tasks(tasks: list) -> list:
+    """Create several tasks concurrently (the shared client keeps us under ~3 req/s).
+
+    Returns one result per input task, in order, with the page ID or the error.
+    """
+    required = ("title", "branch", "priority", "estimated_hours")
+
+    def _create(index: int, task: dict) -> dict:
+        result = {"index": index, "title": task.get("title", "")}
+        missing = [k for k in required if task.get(k) in (None, "")]
+        if missing:
+            return {**result, "ok": False, "error": f"Faltan campos: {', '.join(missing)}"}
+        try:
+            page = notion.pages.create(
+                parent={"database_id": TASKS_DB_ID},
+                properties=_task_properties(
+                    task["title"],
+                    task["branch"],
+                    task["priority"],
+                    task["estimated_hours"],
+                    task.get("due_date") or None,
+                    task.get("notes", ""),
+                ),
+            )
+        except Exception as e:
+            return {**result, "ok": False, "error": str(e)}
+        _mirror_task(page)
+        return {**result, "ok": True, "id": page["id"]}
+
+    with ThreadPoolExecutor(max_workers=NOTION_RATE_LIMIT) as pool:
+        return list(pool.map(_create, range(len(tasks)), tasks))
+
+
+def get_tasks(branch: str = None, status: str = None, limit: int = None,
+              due_after: str = None, due_before: str = None) -> list:
+    """Query tasks, optionally filtered by branch, status and due date range.
+
+    Answers from the local Tasks mirror (refreshed incrementally); falls back
+    to querying Notion directly if the mirror is unavailable.
+    """
+    from tools.tasks_mirror import tasks_mirror
+    try:
+        tasks_mirror.sync()
+        return tasks_mirror.query(
+            branch=branch, status=status, limit=limit,
+            due_after=due_after, due_before=due_before,
+        )
+    except Exception as e:
+        print(f"⚠️ Mirror de tareas no disponible, consultando Notion: {e}")
+        return _get_tasks_live(branch, status, limit, due_after, due_before)
+
+
+def _get_tasks_live(branch: str = None, status: str = None, limit: int = None,
+                    due_after: str = None, due_before: str = None) -> list:
+    """Query tasks from Notion directly (paginated unless `limit` is given)."""
     filters = []
     if branch:
         filters.append({"property": "Branch", "select": {"equals": branch}})
     if status:
         filters.append({"property": "Status", "select": {"equals": status}})
+    if due_after:
+        filters.append({"property": "Due Date", "date": {"on_or_after": due_after}})
+    if due_before:
+        filters.append({"property": "Due Date", "date": {"on_or_before": due_before}})
 
     query_params = {
         "database_id": TASKS_DB_ID,
-        "page_size": 100,
         "sorts": [
             {"property": "Priority", "direction": "descending"},
             {"property": "Due Date", "direction": "ascending"},
@@ -64,33 +132,44 @@ def get_tasks(branch: str = None, status: str = None) -> list:
     if filters:
         query_params["filter"] = {"and": filters} if len(filters) > 1 else filters[0]
 
-    results = notion.databases.query(**query_params)
-    tasks = []
-    for page in results.get("results", []):
-        props = page["properties"]
-        task = {
-            "id": page["id"],
-            "title": _get_text(props.get("Name")),
-            "branch": ((props.get("Branch") or {}).get("select") or {}).get("name", ""),
-            "status": ((props.get("Status") or {}).get("select") or {}).get("name", ""),
-            "priority": ((props.get("Priority") or {}).get("select") or {}).get("name", ""),
-            "estimated_hours": (props.get("Estimated Hours") or {}).get("number") or 0,
-        }
-        due = (props.get("Due Date") or {}).get("date")
-        if due:
-            task["due_date"] = due.get("start", "")
-        tasks.append(task)
-    return tasks
+    return [_task_from_page(page) for page in iter_query(notion, limit=limit, **query_params)]
+
+
+def _task_from_page(page: dict) -> dict:
+    """Shape a Tasks DB page into the dict get_tasks returns."""
+    props = page["properties"]
+    task = {
+        "id": page["id"],
+        "title": _get_text(props.get("Name")),
+        "branch": ((props.get("Branch") or {}).get("select") or {}).get("name", ""),
+        "status": ((props.get("Status") or {}).get("select") or {}).get("name", ""),
+        "priority": ((props.get("Priority") or {}).get("select") or {}).get("name", ""),
+        "estimated_hours": (props.get("Estimated Hours") or {}).get("number") or 0,
+    }
+    due = (props.get("Due Date") or {}).get("date")
+    if due:
+        task["due_date"] = due.get("start", "")
+    return task
+
+
+def _mirror_task(page: dict):
+    """Write-through to the local Tasks mirror; a mirror failure must not fail the write."""
+    from tools.tasks_mirror import tasks_mirror
+    try:
+        tasks_mirror.upsert_page(page)
+    except Exception as e:
+        print(f"⚠️ No se pudo actualizar el mirror de tareas: {e}")
 
 
 def update_task_status(task_id: str, status: str) -> str:
     """Update the status of a task in Notion (e.g. 'Done', 'Pending', 'In Progress')."""
-    notion.pages.update(
+    page = notion.pages.update(
         page_id=task_id,
         properties={
             "Status": {"select": {"name": status}},
         },
     )
+    _mirror_task(page)
     return f"✅ Tarea actualizada a '{status}'"
 
 
@@ -120,17 +199,32 @@ def save_meeting_notes(
 
 
 def get_weekly_hours_by_branch() -> dict:
-    """Return hours logged per branch for the current ISO week."""
+    """Return hours logged per branch for the current ISO week.
+
+    Read from the local Time Log store's running weekly aggregate; falls back
+    to querying Notion directly if the store is unavailable.
+    """
+    from tools.time_log_store import time_log_store
+    try:
+        time_log_store.sync()
+        return time_log_store.hours_by_branch(datetime.now().strftime("%Y-%m-%d"))
+    except Exception as e:
+        print(f"⚠️ Registro de horas local no disponible, consultando Notion: {e}")
+        return _get_weekly_hours_live()
+
+
+def _get_weekly_hours_live() -> dict:
+    """Sum the current week's Time Log pages straight from Notion."""
     monday = (datetime.now() - timedelta(days=datetime.now().weekday())).strftime(
         "%Y-%m-%d"
     )
-    results = notion.databases.query(
+    pages = iter_query(
+        notion,
         database_id=TIME_LOG_DB_ID,
         filter={"property": "Date", "date": {"on_or_after": monday}},
-        page_size=100,
     )
     hours_by_branch: dict = {}
-    for page in results.get("results", []):
+    for page in pages:
         props = page["properties"]
         branch = ((props.get("Branch") or {}).get("select") or {}).get("name")
         hours = (props.get("Hours") or {}).get("number") or 0
@@ -148,8 +242,18 @@ def log_time(branch: str, hours: float, task_description: str = "") -> str:
         "Date": {"date": {"start": datetime.now().strftime("%Y-%m-%d")}},
         "Hours": {"number": hours},
     }
-    notion.pages.create(
+    page = notion.pages.create(
         parent={"database_id": TIME_LOG_DB_ID},
         properties=properties,
     )
+    _record_time_entry(page)
     return f"✅ {hours}h registradas en '{branch}'"
+
+
+def _record_time_entry(page: dict):
+    """Write-through to the local Time Log store; a store failure must not fail the write."""
+    from tools.time_log_store import time_log_store
+    try:
+        time_log_store.upsert_page(page)
+    except Exception as e:
+        print(f"⚠️ No se pudo actualizar el registro de horas local: {e}")
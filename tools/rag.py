@@ -4,20 +4,7 @@ based on keywords in the user's message, without embeddings or external services
 """
 import re
 from tools.documents_tools import search_documents, get_document_content
-
-# Spanish stop words to ignore when extracting keywords
-STOP_WORDS = {
-    "a", "al", "algo", "ante", "antes", "como", "con", "cual", "cuando", "de",
-    "del", "desde", "donde", "durante", "el", "ella", "ellas", "ellos", "en",
-    "entre", "era", "es", "esta", "este", "esto", "estos", "estas", "fue",
-    "han", "has", "hay", "he", "hola", "la", "las", "le", "les", "lo", "los",
-    "me", "mi", "mis", "muy", "no", "nos", "o", "para", "pero", "por", "que",
-    "se", "si", "sin", "sobre", "su", "sus", "también", "te", "tengo", "ti",
-    "toda", "todo", "todos", "tu", "tus", "un", "una", "uno", "unos", "unas",
-    "y", "ya", "yo", "qué", "cómo", "cuál", "quién", "cuándo", "dónde",
-    "puedo", "puede", "quiero", "quiere", "necesito", "hacer", "haz", "dame",
-    "dime", "diles", "tengo", "tiene", "hay", "ver", "mira", "míralo",
-}
+from tools.stop_words import STOP_WORDS
 
 
 def _extract_keywords(text: str) -> list[str]:
@@ -26,6 +13,11 @@ def _extract_keywords(text: str) -> list[str]:
     return [w.lower() for w in words if w.lower() not in STOP_WORDS]
 
 
+def context_keywords(context: str) -> str:
+    """Titles and tags of the documents in a get_relevant_context() result."""
+    return "\n".join(re.findall(r"^📄 (.+) \(", context, re.M))
+
+
 def get_relevant_context(user_message: str, max_docs: int = 2, max_chars_per_doc: int = 3000) -> str:
     """
     Search for documents relevant to the user's message and return
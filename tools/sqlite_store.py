@@ -0,0 +1,162 @@
+"""
+Base classes for the local SQLite stores.
+
+SqliteStore owns the connection setup (schema applied on first connect) and
+a key/value `state` table. NotionDbMirror adds the sync loop shared by the
+mirrors of Notion databases: a full query on the first run (and every
+FULL_RESYNC_SECONDS), last_edited_time deltas in between, and write-through
+of pages the app just created or updated. Subclasses define the schema,
+`_upsert` and their query methods.
+"""
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+
+_STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# Notion rounds last_edited_time to the minute, so deltas overlap by this much
+WATERMARK_OVERLAP = timedelta(minutes=2)
+
+
+def _utc_iso(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class SqliteStore:
+    """SQLite file with a schema applied on first connect and a key/value state table."""
+
+    SCHEMA = ""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()      # serializes writes
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        if not self._initialized:
+            conn.executescript(self.SCHEMA + _STATE_SCHEMA)
+            self._migrate(conn)
+            self._initialized = True
+        return conn
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Hook for schema changes that CREATE IF NOT EXISTS can't express."""
+
+    @staticmethod
+    def _get_state(conn: sqlite3.Connection, key: str):
+        row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _set_state(conn: sqlite3.Connection, key: str, value: str):
+        conn.execute(
+            "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
+    def get_state(self, key: str):
+        with closing(self._connect()) as conn:
+            return self._get_state(conn, key)
+
+
+class NotionDbMirror(SqliteStore):
+    """SQLite copy of a Notion database, refreshed via last_edited_time deltas.
+
+    Notion queries never return archived (deleted) pages, so deletions are
+    only picked up by the periodic full resync, which starts from `_clear`.
+    """
+
+    SYNC_INTERVAL_SECONDS = 60
+    FULL_RESYNC_SECONDS = 6 * 3600     # None: only the first sync is full
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self._sync_lock = threading.Lock()  # one sync at a time
+        self._last_sync = 0.0
+        self._last_full_sync = 0.0
+        self.full_syncs = 0
+        self.incremental_syncs = 0
+        self.pages_applied = 0
+        self.local_writes = 0
+
+    def _database_id(self) -> str:
+        raise NotImplementedError
+
+    def _upsert(self, conn: sqlite3.Connection, item: dict):
+        """Write one item (as returned by `_prepare`) into the store."""
+        raise NotImplementedError
+
+    def _prepare(self, pages: list[dict]) -> list[dict]:
+        """Turn queried pages into the items `_upsert` takes (runs outside the write transaction)."""
+        return pages
+
+    def _clear(self, conn: sqlite3.Connection):
+        """Empty the store before a full resync."""
+
+    # ── Sync ────────────────────────────────────
+
+    def sync(self, force: bool = False):
+        """Bring the store up to date (at most once per SYNC_INTERVAL_SECONDS)."""
+        # Imported here so plain SqliteStore users don't need notion_client
+        from tools.notion_api import get_client, iter_query
+
+        with self._sync_lock:
+            now = time.time()
+            if not force and now - self._last_sync < self.SYNC_INTERVAL_SECONDS:
+                return
+            started = datetime.now(timezone.utc)
+            watermark = self.get_state("watermark")
+            full = watermark is None or (
+                self.FULL_RESYNC_SECONDS is not None
+                and now - self._last_full_sync > self.FULL_RESYNC_SECONDS
+            )
+            params = {"database_id": self._database_id()}
+            if not full:
+                params["filter"] = {
+                    "timestamp": "last_edited_time",
+                    "last_edited_time": {"on_or_after": watermark},
+                }
+            items = self._prepare(list(iter_query(get_client(), **params)))
+
+            with self._lock, closing(self._connect()) as conn, conn:
+                if full:
+                    self._clear(conn)
+                for item in items:
+                    self._upsert(conn, item)
+                self._set_state(conn, "watermark", _utc_iso(started - WATERMARK_OVERLAP))
+
+            if full:
+                self.full_syncs += 1
+                self._last_full_sync = now
+            else:
+                self.incremental_syncs += 1
+            self.pages_applied += len(items)
+            self._last_sync = now
+
+    def upsert_page(self, page: dict):
+        """Apply a page we just created/updated so the next read sees it."""
+        items = self._prepare([page])
+        with self._lock, closing(self._connect()) as conn, conn:
+            for item in items:
+                self._upsert(conn, item)
+        self.local_writes += 1
+
+    def sync_stats(self) -> dict:
+        """Watermark and sync counters, for the subclasses' stats()."""
+        now = time.time()
+        return {
+            "watermark": self.get_state("watermark"),
+            "seconds_since_sync": round(now - self._last_sync, 1) if self._last_sync else None,
+            "seconds_since_full_sync": round(now - self._last_full_sync, 1) if self._last_full_sync else None,
+            "full_syncs": self.full_syncs,
+            "incremental_syncs": self.incremental_syncs,
+            "pages_applied": self.pages_applied,
+            "local_writes": self.local_writes,
+        }
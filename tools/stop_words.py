@@ -0,0 +1,18 @@
+"""
+Spanish stop words, shared by the keyword extractors (RAG, memory
+sections, summary search). Kept dependency-free so pure text modules can
+import it.
+"""
+
+STOP_WORDS = {
+    "a", "al", "algo", "ante", "antes", "como", "con", "cual", "cuando", "de",
+    "del", "desde", "donde", "durante", "el", "ella", "ellas", "ellos", "en",
+    "entre", "era", "es", "esta", "este", "esto", "estos", "estas", "fue",
+    "han", "has", "hay", "he", "hola", "la", "las", "le", "les", "lo", "los",
+    "me", "mi", "mis", "muy", "no", "nos", "o", "para", "pero", "por", "que",
+    "se", "si", "sin", "sobre", "su", "sus", "también", "te", "tengo", "ti",
+    "toda", "todo", "todos", "tu", "tus", "un", "una", "uno", "unos", "unas",
+    "y", "ya", "yo", "qué", "cómo", "cuál", "quién", "cuándo", "dónde",
+    "puedo", "puede", "quiero", "quiere", "necesito", "hacer", "haz", "dame",
+    "dime", "diles", "tengo", "tiene", "hay", "ver", "mira", "míralo",
+}
@@ -0,0 +1,154 @@
+"""
+Hierarchical rollup of conversation summaries.
+
+Session summaries of each finished ISO week are merged into a weekly digest,
+and the weekly digests of each finished month into a monthly digest. Digests
+live in the same Notion database as the sessions, tagged by the "Nivel"
+select, so prompt assembly and search can use the coarser levels for older
+history. The job is idempotent: it only builds digests that don't exist yet.
+"""
+import json
+from datetime import date, datetime, timedelta
+
+import anthropic
+
+from tools import conversation_memory
+from tools.conversation_memory import (
+    LEVEL_MONTH,
+    LEVEL_SESSION,
+    LEVEL_WEEK,
+    LEVELS,
+    save_conversation_summary,
+    sync_summary_store,
+)
+from tools.summary_store import summary_store
+
+client = anthropic.Anthropic()
+
+# Digests written per run; a first run on a long history catches up over a few days
+MAX_DIGESTS_PER_RUN = 8
+# A month is rolled up once its last week has also finished
+MONTH_GRACE_DAYS = 7
+
+_MONTHS = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio",
+           "agosto", "septiembre", "octubre", "noviembre", "diciembre"]
+
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _parse(value: str) -> date:
+    return datetime.strptime(value[:10], "%Y-%m-%d").date()
+
+
+def ensure_level_property():
+    """Add the "Nivel" select to the summaries DB (no-op if it's already there)."""
+    conversation_memory._notion().databases.update(
+        database_id=conversation_memory.CONV_SUMMARIES_DB_ID,
+        properties={"Nivel": {"select": {"options": [{"name": level} for level in LEVELS]}}},
+    )
+
+
+def _digest(level: str, period: str, sources: list[dict]) -> dict:
+    """Ask Sonnet to merge `sources` into one digest; returns narrative + metadata."""
+    material = "\n\n".join(
+        f"--- {s['title']} ({s['date'][:10]}) ---\n{s['body']}" for s in sources
+    )
+    scope = "sesiones de esta semana" if level == LEVEL_WEEK else "resúmenes semanales de este mes"
+    response = client.messages.create(
+        model="claude-sonnet-4-6",
+        max_tokens=2048,
+        messages=[{
+            "role": "user",
+            "content": f"""Eres el sistema de memoria episódica de un asistente personal. Condensa las {scope} ({period}) en un único resumen {level}.
+
+MATERIAL:
+{material}
+
+INSTRUCCIONES:
+1. Escribe un resumen NARRATIVO de 250-450 palabras, en pasado.
+2. Conserva lo que será útil recordar dentro de meses: decisiones y su porqué, avances y bloqueos de proyectos, personas y su contexto, compromisos y fechas, cambios de prioridades.
+3. Omite detalles operativos que ya no importan (tareas rutinarias cerradas, saludos, pruebas).
+
+Después del resumen, en una línea "---METADATA---", añade este JSON:
+{{"temas": ["tema1", "tema2"], "personas": ["persona1"], "acciones": "Acciones o compromisos que siguen abiertos"}}""",
+        }],
+    )
+    result = response.content[0].text.strip()
+    narrative, metadata = result, {}
+    if "---METADATA---" in result:
+        narrative, metadata_str = result.split("---METADATA---", 1)
+        try:
+            metadata = json.loads(metadata_str.strip())
+        except json.JSONDecodeError:
+            metadata = {}
+    return {
+        "summary_text": narrative.strip(),
+        "temas": metadata.get("temas", []),
+        "personas": metadata.get("personas", []),
+        "acciones": metadata.get("acciones", ""),
+    }
+
+
+def _pending_weeks(today: date) -> list[tuple[date, list[dict]]]:
+    """Finished weeks that have sessions but no weekly digest, oldest first."""
+    done = {_parse(d["date"]) for d in summary_store.latest(LEVEL_WEEK)}
+    by_week: dict[date, list] = {}
+    for session in summary_store.latest(LEVEL_SESSION, before=_week_start(today).isoformat()):
+        by_week.setdefault(_week_start(_parse(session["date"])), []).append(session)
+    return [(week, sorted(by_week[week], key=lambda s: s["date"]))
+            for week in sorted(by_week) if week not in done]
+
+
+def _pending_months(today: date) -> list[tuple[date, list[dict]]]:
+    """Finished months that have weekly digests but no monthly digest, oldest first."""
+    done = {_parse(d["date"]) for d in summary_store.latest(LEVEL_MONTH)}
+    by_month: dict[date, list] = {}
+    for weekly in summary_store.latest(LEVEL_WEEK):
+        week = _parse(weekly["date"])
+        by_month.setdefault(week.replace(day=1), []).append(weekly)
+    pending = []
+    for month in sorted(by_month):
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        if month in done or today < next_month + timedelta(days=MONTH_GRACE_DAYS):
+            continue
+        pending.append((month, sorted(by_month[month], key=lambda s: s["date"])))
+    return pending
+
+
+def rollup_summaries(today: date = None) -> dict:
+    """Write any missing weekly, then monthly, digests. Returns how many were written."""
+    if not conversation_memory.CONV_SUMMARIES_DB_ID:
+        return {"weekly": 0, "monthly": 0}
+    today = today or datetime.now().date()
+    ensure_level_property()
+    sync_summary_store(force=True)
+
+    written = {"weekly": 0, "monthly": 0}
+    budget = MAX_DIGESTS_PER_RUN
+    for week, sessions in _pending_weeks(today)[:budget]:
+        period = f"semana del {week.day} de {_MONTHS[week.month - 1]} de {week.year}"
+        digest = _digest(LEVEL_WEEK, period, sessions)
+        save_conversation_summary(
+            title=f"Resumen semanal · {period}",
+            num_messages=len(sessions),
+            level=LEVEL_WEEK,
+            date=week.isoformat(),
+            **digest,
+        )
+        written["weekly"] += 1
+    budget -= written["weekly"]
+
+    for month, weeklies in _pending_months(today)[:max(budget, 0)]:
+        period = f"{_MONTHS[month.month - 1]} de {month.year}"
+        digest = _digest(LEVEL_MONTH, period, weeklies)
+        save_conversation_summary(
+            title=f"Resumen mensual · {period}",
+            num_messages=len(weeklies),
+            level=LEVEL_MONTH,
+            date=month.isoformat(),
+            **digest,
+        )
+        written["monthly"] += 1
+    return written
@@ -0,0 +1,284 @@
+"""
+Local SQLite store of conversation summaries.
+
+Summaries are written once and never edited, so each body is stored
+together with the page's last_edited_time and read from Notion only when
+that timestamp changes. A warm refresh of the recent summaries is then a
+single database query. The store syncs like the other Notion mirrors
+(sqlite_store.NotionDbMirror); bodies of new or edited pages are read
+concurrently before they are written.
+
+Titles, bodies and metadata are also indexed in an FTS5 table for ranked
+full-text search (BM25, accent-insensitive). Each row carries its rollup
+level: a session summary or a weekly/monthly digest.
+"""
+import os
+import re
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+from notion_client import Client
+from tools.notion_api import NOTION_RATE_LIMIT, get_client
+from tools.sqlite_store import NotionDbMirror
+from tools.stop_words import STOP_WORDS
+
+STORE_DB = os.environ.get("SUMMARY_STORE_DB", "summaries.db")
+CONV_SUMMARIES_DB_ID = os.environ.get("NOTION_CONV_SUMMARIES_DB_ID", "")
+# Body reads in flight at once (the shared client throttles to Notion's rate anyway)
+BODY_WORKERS = NOTION_RATE_LIMIT
+
+# Rollup levels ("Nivel" select). Pages without a level are session summaries.
+LEVEL_SESSION = "sesión"
+LEVEL_WEEK = "semanal"
+LEVEL_MONTH = "mensual"
+LEVELS = [LEVEL_SESSION, LEVEL_WEEK, LEVEL_MONTH]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    id TEXT PRIMARY KEY,
+    last_edited_time TEXT NOT NULL,
+    title TEXT NOT NULL,
+    date TEXT NOT NULL,
+    temas TEXT NOT NULL,
+    personas TEXT NOT NULL,
+    acciones TEXT NOT NULL,
+    body TEXT NOT NULL,
+    level TEXT NOT NULL DEFAULT 'sesión'
+);
+CREATE INDEX IF NOT EXISTS idx_summaries_date ON summaries(date);
+"""
+
+# Kept separate: FTS5 is a compile-time option of SQLite
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS summaries_fts USING fts5(
+    id UNINDEXED, title, temas, personas, acciones, body,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# bm25() column weights, in summaries_fts column order (id is unindexed)
+_FTS_WEIGHTS = (0.0, 5.0, 3.0, 3.0, 1.5, 1.0)
+_BODY_COLUMN = 5
+
+_COLUMNS = ("id", "last_edited_time", "title", "date", "temas", "personas", "acciones", "body", "level")
+
+
+def _summary_from_page(page: dict) -> dict:
+    """Metadata of a summary page (everything but the body)."""
+    props = page["properties"]
+    title_items = (props.get("Título") or {}).get("title", [])
+    acciones_rt = (props.get("Acciones generadas") or {}).get("rich_text", [])
+    return {
+        "id": page["id"],
+        "title": "".join(t.get("plain_text", "") for t in title_items),
+        "date": ((props.get("Fecha") or {}).get("date") or {}).get("start", ""),
+        "temas": [t["name"] for t in (props.get("Temas") or {}).get("multi_select", [])],
+        "personas": [
+            p["name"]
+            for p in (props.get("Personas mencionadas") or {}).get("multi_select", [])
+        ],
+        "acciones": "".join(a.get("plain_text", "") for a in acciones_rt),
+        "level": ((props.get("Nivel") or {}).get("select") or {}).get("name") or LEVEL_SESSION,
+    }
+
+
+def _read_page_body(notion: Client, page_id: str) -> str:
+    """Read all text blocks from a Notion page body (paginated)."""
+    lines = []
+    cursor = None
+    while True:
+        params = {"block_id": page_id, "page_size": 100}
+        if cursor:
+            params["start_cursor"] = cursor
+        blocks = notion.blocks.children.list(**params)
+        for block in blocks.get("results", []):
+            btype = block["type"]
+            if btype in (
+                "paragraph", "heading_1", "heading_2", "heading_3",
+                "bulleted_list_item", "numbered_list_item",
+            ):
+                rich_text = block[btype].get("rich_text", [])
+                text = "".join(rt["plain_text"] for rt in rich_text)
+                if text.strip():
+                    lines.append(text)
+        if not blocks.get("has_more"):
+            break
+        cursor = blocks["next_cursor"]
+    return "\n".join(lines) or "[Resumen vacío]"
+
+
+def _with_body(page: dict) -> dict:
+    return {
+        **_summary_from_page(page),
+        "last_edited_time": page.get("last_edited_time", ""),
+        "body": _read_page_body(get_client(), page["id"]),
+    }
+
+
+class SummaryStore(NotionDbMirror):
+    """Summaries (metadata + body) keyed by page ID and last_edited_time."""
+
+    SCHEMA = _SCHEMA
+    # Summaries aren't deleted in practice: after the first backfill, deltas only
+    FULL_RESYNC_SECONDS = None
+
+    def __init__(self, path: str = STORE_DB):
+        super().__init__(path)
+        self.fts_available = True
+        self.hits = 0
+        self.misses = 0
+
+    def _migrate(self, conn: sqlite3.Connection):
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(summaries)")}
+        if "level" not in columns:
+            # Stores created before digests existed only hold session summaries
+            conn.execute("ALTER TABLE summaries ADD COLUMN level TEXT NOT NULL DEFAULT 'sesión'")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_level_date ON summaries(level, date)")
+        try:
+            conn.executescript(_FTS_SCHEMA)
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ SQLite sin FTS5, búsqueda de texto en resúmenes desactivada: {e}")
+            self.fts_available = False
+
+    def _database_id(self) -> str:
+        return CONV_SUMMARIES_DB_ID
+
+    def _prepare(self, pages: list[dict]) -> list[dict]:
+        """Pages whose stored copy is missing or outdated, with their bodies read from Notion."""
+        stale = [page for page in pages if self.get(page["id"], page.get("last_edited_time")) is None]
+        if not stale:
+            return []
+        with ThreadPoolExecutor(max_workers=BODY_WORKERS) as pool:
+            return list(pool.map(_with_body, stale))
+
+    def load(self, pages: list[dict]) -> list[dict]:
+        """The stored summaries of `pages`, in order; missing bodies are read and stored first."""
+        fetched = {summary["id"]: summary for summary in self._prepare(pages)}
+        for summary in fetched.values():
+            try:
+                self.put(summary)
+            except Exception as e:
+                print(f"⚠️ No se pudo guardar el resumen en local: {e}")
+        return [fetched.get(page["id"]) or self.get(page["id"]) for page in pages]
+
+    @staticmethod
+    def _row_to_summary(row) -> dict:
+        summary = dict(zip(_COLUMNS, row))
+        summary["temas"] = json.loads(summary["temas"])
+        summary["personas"] = json.loads(summary["personas"])
+        return summary
+
+    def get(self, page_id: str, last_edited_time: str = None) -> dict | None:
+        """The stored summary, if present (and current, when a timestamp is given)."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM summaries WHERE id = ?", (page_id,)
+            ).fetchone()
+        if row is None or (last_edited_time and row[1] != last_edited_time):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._row_to_summary(row)
+
+    def latest(self, level: str, limit: int = None, before: str = None) -> list[dict]:
+        """Summaries of one level, newest first (optionally dated before `before`)."""
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM summaries WHERE level = ?"
+        args: list = [level]
+        if before:
+            sql += " AND date < ?"
+            args.append(before)
+        sql += " ORDER BY date DESC"
+        if limit:
+            sql += " LIMIT ?"
+            args.append(limit)
+        with closing(self._connect()) as conn:
+            return [self._row_to_summary(row) for row in conn.execute(sql, args)]
+
+    def put(self, summary: dict):
+        """Insert or replace a summary; `summary` needs every stored field."""
+        with self._lock, closing(self._connect()) as conn, conn:
+            self._upsert(conn, summary)
+
+    def _upsert(self, conn: sqlite3.Connection, summary: dict):
+        conn.execute(
+            f"INSERT OR REPLACE INTO summaries ({', '.join(_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+            (
+                summary["id"],
+                summary["last_edited_time"],
+                summary["title"],
+                summary["date"],
+                json.dumps(summary["temas"], ensure_ascii=False),
+                json.dumps(summary["personas"], ensure_ascii=False),
+                summary["acciones"],
+                summary["body"],
+                summary["level"],
+            ),
+        )
+        if self.fts_available:
+            conn.execute("DELETE FROM summaries_fts WHERE id = ?", (summary["id"],))
+            conn.execute(
+                "INSERT INTO summaries_fts (id, title, temas, personas, acciones, body) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    summary["id"],
+                    summary["title"],
+                    " ".join(summary["temas"]),
+                    " ".join(summary["personas"]),
+                    summary["acciones"],
+                    summary["body"],
+                ),
+            )
+
+    def search(self, query: str, limit: int = 8) -> list[dict]:
+        """Summaries matching any word of `query`, best BM25 score first, with a body snippet.
+
+        Stop words and 1-2 letter words are ignored, so they can't match
+        every summary.
+        """
+        words = [w for w in re.findall(r"\w+", query) if len(w) > 2 and w.lower() not in STOP_WORDS]
+        if not words or not self.fts_available:
+            return []
+        # Quote every term (no FTS syntax from user input) and prefix-match it
+        match = " OR ".join(f'"{w}"*' for w in words)
+        weights = ", ".join(str(w) for w in _FTS_WEIGHTS)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT s.id, s.title, s.date, s.level, s.temas, s.personas, "
+                f"snippet(summaries_fts, {_BODY_COLUMN}, '**', '**', '…', 24), "
+                f"bm25(summaries_fts, {weights}) AS score "
+                f"FROM summaries_fts JOIN summaries s ON s.id = summaries_fts.id "
+                f"WHERE summaries_fts MATCH ? ORDER BY score LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        # bm25 is negative; 0 means the match added no relevance
+        return [
+            {
+                "id": row[0],
+                "title": row[1],
+                "date": row[2],
+                "level": row[3],
+                "temas": json.loads(row[4]),
+                "personas": json.loads(row[5]),
+                "snippet": row[6],
+                "score": round(-row[7], 3),
+            }
+            for row in rows
+            if row[7] < 0
+        ]
+
+    def stats(self) -> dict:
+        with closing(self._connect()) as conn:
+            count = conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+        return {
+            "summaries": count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "fts": self.fts_available,
+            **self.sync_stats(),
+        }
+
+
+summary_store = SummaryStore()
@@ -0,0 +1,119 @@
+"""
+Local SQLite mirror of the Notion Tasks database.
+
+Seeded once with a full query, then refreshed incrementally with a
+last_edited_time filter. create_task / update_task_status write through, and
+branch/status/due-date filters run locally against indexed columns.
+
+Notion queries never return archived (deleted) pages, so deletions are only
+picked up by the periodic full resync (see sqlite_store.NotionDbMirror).
+"""
+import os
+import json
+import sqlite3
+from contextlib import closing
+from datetime import date, timedelta
+
+from tools import notion_tools
+from tools.sqlite_store import NotionDbMirror
+
+MIRROR_DB = os.environ.get("TASKS_MIRROR_DB", "tasks_mirror.db")
+
+PRIORITY_RANK = {"High": 0, "Medium": 1, "Low": 2}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    branch TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority_rank INTEGER NOT NULL,
+    due_date TEXT,
+    last_edited_time TEXT NOT NULL,
+    task TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_branch_status ON tasks(branch, status);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+CREATE INDEX IF NOT EXISTS idx_tasks_due ON tasks(due_date);
+"""
+
+
+class TasksMirror(NotionDbMirror):
+    """SQLite-backed copy of the Tasks DB, refreshed via last_edited_time deltas."""
+
+    SCHEMA = _SCHEMA
+
+    def __init__(self, path: str = MIRROR_DB):
+        super().__init__(path)
+
+    def _database_id(self) -> str:
+        return notion_tools.TASKS_DB_ID
+
+    def _clear(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM tasks")
+
+    def _upsert(self, conn: sqlite3.Connection, page: dict):
+        if page.get("archived") or page.get("in_trash"):
+            conn.execute("DELETE FROM tasks WHERE id = ?", (page["id"],))
+            return
+        task = notion_tools._task_from_page(page)
+        conn.execute(
+            "INSERT OR REPLACE INTO tasks "
+            "(id, branch, status, priority_rank, due_date, last_edited_time, task) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                task["id"],
+                task["branch"],
+                task["status"],
+                PRIORITY_RANK.get(task["priority"], len(PRIORITY_RANK)),
+                task.get("due_date"),
+                page.get("last_edited_time", ""),
+                json.dumps(task, ensure_ascii=False),
+            ),
+        )
+
+    # ── Queries ─────────────────────────────────
+
+    def query(self, branch: str = None, status: str = None, limit: int = None,
+              due_after: str = None, due_before: str = None) -> list:
+        """Tasks ordered by priority (High first), then due date (undated last).
+
+        `due_after`/`due_before` are inclusive YYYY-MM-DD bounds (range scans on
+        idx_tasks_due); undated tasks never match them.
+        """
+        where = []
+        args: list = []
+        if branch:
+            where.append("branch = ?")
+            args.append(branch)
+        if status:
+            where.append("status = ?")
+            args.append(status)
+        if due_after:
+            where.append("due_date >= ?")
+            args.append(due_after)
+        if due_before:
+            # Due dates may carry a time ('2026-10-17T10:00...'), so bound by the next day
+            next_day = date.fromisoformat(due_before[:10]) + timedelta(days=1)
+            where.append("due_date < ?")
+            args.append(next_day.isoformat())
+
+        sql = "SELECT task FROM tasks"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY priority_rank, due_date IS NULL, due_date"
+        if limit:
+            sql += " LIMIT ?"
+            args.append(limit)
+
+        with closing(self._connect()) as conn:
+            return [json.loads(row[0]) for row in conn.execute(sql, args)]
+
+    def stats(self) -> dict:
+        """Size and staleness of the mirror."""
+        with closing(self._connect()) as conn:
+            count = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+            newest_edit = conn.execute("SELECT MAX(last_edited_time) FROM tasks").fetchone()[0]
+        return {"tasks": count, "newest_edit": newest_edit, **self.sync_stats()}
+
+
+tasks_mirror = TasksMirror()
@@ -0,0 +1,145 @@
+"""
+Local SQLite store of the Notion Time Log database with a running
+per-week, per-branch hours aggregate.
+
+Seeded with a full query, then refreshed with last_edited_time deltas;
+log_time writes through. Every upsert adjusts the weekly_hours rows by the
+difference between the entry's old and new contribution, so hours-by-branch
+for a week is a single indexed lookup instead of a Notion query.
+
+Notion queries never return archived (deleted) pages, so deletions are only
+picked up by the periodic full resync, which rebuilds the aggregate.
+"""
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timedelta
+
+from tools import notion_tools
+from tools.sqlite_store import NotionDbMirror
+
+STORE_DB = os.environ.get("TIME_LOG_STORE_DB", "time_log.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    week TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    hours REAL NOT NULL,
+    description TEXT NOT NULL,
+    last_edited_time TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_date ON entries(date);
+CREATE TABLE IF NOT EXISTS weekly_hours (
+    week TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    hours REAL NOT NULL,
+    PRIMARY KEY (week, branch)
+);
+"""
+
+
+def week_start(day: str) -> str:
+    """Monday (YYYY-MM-DD) of the ISO week containing `day`."""
+    d = datetime.strptime(day[:10], "%Y-%m-%d")
+    return (d - timedelta(days=d.weekday())).strftime("%Y-%m-%d")
+
+
+def entry_from_page(page: dict) -> dict | None:
+    """Shape a Time Log page into an entry; None if it has no date or branch."""
+    props = page["properties"]
+    branch = ((props.get("Branch") or {}).get("select") or {}).get("name")
+    date = ((props.get("Date") or {}).get("date") or {}).get("start")
+    if not branch or not date:
+        return None
+    return {
+        "id": page["id"],
+        "date": date[:10],
+        "branch": branch,
+        "hours": (props.get("Hours") or {}).get("number") or 0,
+        "description": notion_tools._get_text(props.get("Task")),
+    }
+
+
+class TimeLogStore(NotionDbMirror):
+    """SQLite copy of the Time Log plus an incrementally maintained weekly aggregate."""
+
+    SCHEMA = _SCHEMA
+
+    def __init__(self, path: str = STORE_DB):
+        super().__init__(path)
+
+    def _database_id(self) -> str:
+        return notion_tools.TIME_LOG_DB_ID
+
+    def _clear(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM weekly_hours")
+
+    @staticmethod
+    def _add_hours(conn: sqlite3.Connection, week: str, branch: str, hours: float):
+        conn.execute(
+            "INSERT INTO weekly_hours (week, branch, hours) VALUES (?, ?, ?) "
+            "ON CONFLICT(week, branch) DO UPDATE SET hours = hours + excluded.hours",
+            (week, branch, hours),
+        )
+
+    def _upsert(self, conn: sqlite3.Connection, page: dict):
+        # Retract the entry's previous contribution before applying the new one
+        old = conn.execute(
+            "SELECT week, branch, hours FROM entries WHERE id = ?", (page["id"],)
+        ).fetchone()
+        if old:
+            self._add_hours(conn, old[0], old[1], -old[2])
+            conn.execute("DELETE FROM entries WHERE id = ?", (page["id"],))
+
+        entry = None
+        if not (page.get("archived") or page.get("in_trash")):
+            entry = entry_from_page(page)
+        if entry is None:
+            return
+        week = week_start(entry["date"])
+        conn.execute(
+            "INSERT INTO entries (id, date, week, branch, hours, description, last_edited_time) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                entry["id"],
+                entry["date"],
+                week,
+                entry["branch"],
+                entry["hours"],
+                entry["description"],
+                page.get("last_edited_time", ""),
+            ),
+        )
+        self._add_hours(conn, week, entry["branch"], entry["hours"])
+
+    # ── Queries ─────────────────────────────────
+
+    def hours_by_branch(self, day: str) -> dict:
+        """Hours logged per branch in the ISO week containing `day`."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT branch, hours FROM weekly_hours WHERE week = ? AND hours > 0",
+                (week_start(day),),
+            ).fetchall()
+        return {branch: round(hours, 2) for branch, hours in rows}
+
+    def entries(self) -> list:
+        """Every logged entry, oldest first."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT id, date, branch, hours, description FROM entries ORDER BY date"
+            ).fetchall()
+        keys = ("id", "date", "branch", "hours", "description")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def stats(self) -> dict:
+        with closing(self._connect()) as conn:
+            count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            weeks = conn.execute("SELECT COUNT(DISTINCT week) FROM weekly_hours").fetchone()[0]
+        return {"entries": count, "weeks": weeks, **self.sync_stats()}
+
+
+time_log_store = TimeLogStore()